@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Load and latency benchmark for the voice wrapper.
+
+Drives the FastAPI app in-process over httpx's ASGI transport, with
+fake-tmux.py standing in for tmux, so it runs on a plain Linux box with
+no tmux, ttyd or Tailscale. Prints p50/p99 latency and throughput per
+scenario. Client and server share one event loop, so the numbers include
+client overhead; compare runs against each other, not against a phone.
+
+    python3 scripts/benchmark.py                    # every scenario
+    python3 scripts/benchmark.py keys copy --latency 0.01 --clients 20
+    python3 scripts/benchmark.py --fork             # without control mode
+
+Needs httpx (`pip install httpx`) on top of the wrapper's own dependencies.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError:
+    sys.exit("benchmark.py needs httpx: pip install httpx")
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+SESSION = "bench"
+TAP_KEYS = ["Up", "Down", "Left", "Right", "Tab"]
+TMUX_SAMPLE = re.compile(
+    r'^voice_wrapper_tmux_command_(duration_seconds_sum|duration_seconds_count|failures_total)'
+    r'\{command="([^"]*)"[^}]*\} (\S+)$')
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class Result:
+    """Latencies and volume for one kind of request in a scenario."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.notes = ""
+
+    async def timed(self, request):
+        """Await an httpx request, recording its latency and outcome."""
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.errors += 1
+            return None
+        self.latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    def as_dict(self) -> dict:
+        count = len(self.latencies)
+        return {
+            "name": self.name,
+            "requests": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+            "max_ms": round(max(self.latencies, default=0) * 1000, 2),
+            "req_per_s": round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            "mb_per_s": round(self.bytes / self.elapsed / 1e6, 2) if self.elapsed else 0.0,
+            "notes": self.notes,
+        }
+
+
+async def run_for(result: Result, workers):
+    """Run worker coroutines concurrently and time the whole batch."""
+    start = time.perf_counter()
+    await asyncio.gather(*workers)
+    result.elapsed = time.perf_counter() - start
+
+
+# ── scenarios ───────────────────────────────────────────────────────────
+
+async def key_storm(client: httpx.AsyncClient, args) -> list[Result]:
+    """Many clients tapping keys as fast as the server answers."""
+    result = Result("key taps")
+
+    async def tapper(n: int):
+        for i in range(args.requests // args.clients):
+            key = TAP_KEYS[(n + i) % len(TAP_KEYS)]
+            await result.timed(client.post(f"/key?session={SESSION}", json={"key": key}))
+
+    await run_for(result, [tapper(n) for n in range(args.clients)])
+    return [result]
+
+
+async def copy_polling(client: httpx.AsyncClient, args) -> list[Result]:
+    """Clients polling /copy incrementally while the pane keeps printing."""
+    result = Result("copy polls")
+    writes = Result("writes")
+    done = asyncio.Event()
+    not_modified = 0
+
+    async def writer():
+        while not done.is_set():
+            await writes.timed(client.post(
+                f"/send?session={SESSION}", json={"text": "echo benchmark " * 4}))
+            await asyncio.sleep(0.02)
+
+    async def poller():
+        nonlocal not_modified
+        since, etag = None, None
+        for _ in range(args.requests // args.clients):
+            url = f"/copy?session={SESSION}" + (f"&since={since}" if since is not None else "")
+            headers = {"If-None-Match": etag} if etag else {}
+            response = await result.timed(client.get(url, headers=headers))
+            if response is None:
+                continue
+            result.bytes += len(response.content)
+            if response.status_code == 304:
+                not_modified += 1
+            elif response.status_code == 200:
+                since, etag = response.json()["screen_top"], response.headers.get("etag")
+            await asyncio.sleep(args.poll_interval)
+
+    write_task = asyncio.ensure_future(writer())
+    await run_for(result, [poller() for _ in range(args.clients)])
+    done.set()
+    await write_task
+    writes.elapsed = result.elapsed
+    result.notes = f"{not_modified} not modified"
+    return [result, writes]
+
+
+async def parallel_uploads(client: httpx.AsyncClient, args) -> list[Result]:
+    """Several full-size uploads at once."""
+    result = Result("uploads")
+    # Distinct contents, so deduplication doesn't short-circuit the work
+    payloads = [bytes([i % 256]) * args.upload_size for i in range(args.uploads)]
+
+    async def upload(i: int, payload: bytes):
+        files = {"file": (f"bench-{i}.bin", payload, "application/octet-stream")}
+        response = await result.timed(client.post("/upload", files=files))
+        if response is not None and "error" not in response.json():
+            result.bytes += len(payload)
+
+    await run_for(result, [upload(i, p) for i, p in enumerate(payloads)])
+    return [result]
+
+
+async def chunked_uploads(client: httpx.AsyncClient, args) -> list[Result]:
+    """The same uploads through resumable sessions, chunks PUT in parallel."""
+    result = Result("chunk PUTs")
+    payloads = [bytes([(i + 128) % 256]) * args.upload_size for i in range(args.uploads)]
+    finished = 0
+
+    async def upload(i: int, payload: bytes):
+        nonlocal finished
+        response = await result.timed(client.post(
+            "/upload/session", json={"name": f"bench-{i}.bin", "size": len(payload)}))
+        if response is None or response.status_code != 200:
+            return
+        session = response.json()
+        url, size = f"/upload/session/{session['id']}", session["chunk_size"]
+        for start in range(0, len(payload), size * 4):
+            await asyncio.gather(*(
+                result.timed(client.put(url, params={"offset": o}, content=payload[o:o + size]))
+                for o in range(start, min(start + size * 4, len(payload)), size)))
+        response = await result.timed(client.post(url + "/finish"))
+        if response is not None and response.status_code == 200:
+            result.bytes += len(payload)
+            finished += 1
+
+    await run_for(result, [upload(i, p) for i, p in enumerate(payloads)])
+    result.notes = f"{finished}/{len(payloads)} files assembled"
+    return [result]
+
+
+async def claim_churn(client: httpx.AsyncClient, args, wrapper) -> list[Result]:
+    """Devices repeatedly stealing the session while others check it."""
+    claims, checks = Result("claims"), Result("claim checks")
+    delivered = 0
+    done = asyncio.Event()
+
+    async def listener(subscription):
+        nonlocal delivered
+        while not done.is_set() or not subscription.queue.empty():
+            if await subscription.get(timeout=0.1) is not None:
+                delivered += 1
+
+    async def device(n: int):
+        session_id = None
+        for _ in range(args.requests // args.clients):
+            response = await claims.timed(client.post(
+                f"/session/claim?session={SESSION}", json={"device": f"bench-{n}"}))
+            if response is not None and response.status_code == 200:
+                session_id = response.json()["session_id"]
+            if session_id:
+                await checks.timed(client.get(f"/session/check/{session_id}?session={SESSION}"))
+
+    # Stand-ins for the SSE streams each open page holds
+    subscriptions = [wrapper.session_events.subscribe() for _ in range(args.clients)]
+    listeners = [asyncio.ensure_future(listener(s)) for s in subscriptions]
+    try:
+        await run_for(claims, [device(n) for n in range(args.clients)])
+    finally:
+        done.set()
+        await asyncio.gather(*listeners)
+        for subscription in subscriptions:
+            subscription.close()
+    checks.elapsed = claims.elapsed
+    expected = (len(claims.latencies) - claims.errors) * args.clients
+    claims.notes = f"{delivered}/{expected} claim events delivered"
+    return [claims, checks]
+
+
+async def wake_snapshots(client: httpx.AsyncClient, args) -> list[Result]:
+    """Phones waking up and fetching /screen while the pane keeps printing.
+
+    The session is claimed first, so the server also refreshes the screen
+    in the background (refresh_screen_snapshots) between wakes.
+    """
+    result = Result("wake /screen")
+    writes = Result("writes")
+    done = asyncio.Event()
+    not_modified = 0
+    ages: list[float] = []
+
+    async def writer():
+        while not done.is_set():
+            await writes.timed(client.post(
+                f"/send?session={SESSION}", json={"text": "echo benchmark " * 4}))
+            await asyncio.sleep(0.1)
+
+    async def phone():
+        nonlocal not_modified
+        etag = None
+        for _ in range(args.requests // args.clients):
+            await asyncio.sleep(args.poll_interval * 4)  # asleep
+            headers = {"If-None-Match": etag} if etag else {}
+            response = await result.timed(client.get(f"/screen?session={SESSION}", headers=headers))
+            if response is None:
+                continue
+            result.bytes += len(response.content)
+            if response.status_code == 304:
+                not_modified += 1
+            elif response.status_code == 200:
+                etag = response.headers.get("etag")
+                ages.append(time.time() - response.json()["updated_at"])
+
+    await client.post(f"/session/claim?session={SESSION}", json={"device": "bench-wake"})
+    write_task = asyncio.ensure_future(writer())
+    await run_for(result, [phone() for _ in range(args.clients)])
+    done.set()
+    await write_task
+    writes.elapsed = result.elapsed
+    result.notes = (f"{not_modified} not modified, frames p50 "
+                    f"{percentile(ages, 50) * 1000:.0f}ms old")
+    return [result, writes]
+
+
+SCENARIOS = {
+    "keys": key_storm,
+    "copy": copy_polling,
+    "upload": parallel_uploads,
+    "chunked": chunked_uploads,
+    "claims": claim_churn,
+    "wake": wake_snapshots,
+}
+
+
+# ── harness ─────────────────────────────────────────────────────────────
+
+def tmux_summary(metrics: str) -> dict:
+    """Per-subcommand tmux count, mean latency and failures from /metrics."""
+    totals: dict[str, dict] = {}
+    for line in metrics.splitlines():
+        match = TMUX_SAMPLE.match(line)
+        if not match:
+            continue
+        kind, command, value = match.groups()
+        entry = totals.setdefault(command, {"count": 0, "sum": 0.0, "failures": 0})
+        key = {"duration_seconds_sum": "sum", "duration_seconds_count": "count"}.get(kind, "failures")
+        entry[key] += float(value) if key == "sum" else int(float(value))
+    return {
+        command: {
+            "count": t["count"],
+            "failures": t["failures"],
+            "avg_ms": round(t["sum"] / t["count"] * 1000, 2) if t["count"] else 0.0,
+        }
+        for command, t in totals.items()
+    }
+
+
+def load_wrapper(workdir: Path, args):
+    """Import voice-wrapper.py with fake-tmux.py first on PATH as `tmux`."""
+    bindir = workdir / "bin"
+    bindir.mkdir()
+    shim = bindir / "tmux"
+    shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{SCRIPT_DIR / "fake-tmux.py"}" "$@"\n')
+    shim.chmod(0o755)
+    os.environ["PATH"] = f"{bindir}{os.pathsep}{os.environ.get('PATH', '')}"
+    os.environ.update({
+        "FAKE_TMUX_SESSIONS": SESSION,
+        "FAKE_TMUX_LINES": str(args.lines),
+        "FAKE_TMUX_LATENCY": str(args.latency),
+        "TMUX_SESSION": SESSION,
+        "TMUX_CONTROL": "0" if args.fork else "1",
+        "UPLOAD_DIR": str(workdir / "uploads"),
+        "IMAGE_NORMALIZE": "0",
+    })
+    spec = importlib.util.spec_from_file_location("voice_wrapper", SCRIPT_DIR / "voice-wrapper.py")
+    module = sys.modules["voice_wrapper"] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def print_table(results: list[dict]):
+    columns = ["name", "requests", "errors", "p50_ms", "p99_ms", "max_ms", "req_per_s", "mb_per_s"]
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in results:
+        line = "  ".join(str(r[c]).ljust(w) for c, w in zip(columns, widths))
+        print(line + (f"  ({r['notes']})" if r["notes"] else ""))
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory(prefix="voice-wrapper-bench-") as tmp:
+        wrapper = load_wrapper(Path(tmp), args)
+        transport = httpx.ASGITransport(app=wrapper.app)
+        results: list[dict] = []
+        async with wrapper.lifespan(wrapper.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                         timeout=60) as client:
+                for name in args.scenarios:
+                    scenario = SCENARIOS[name]
+                    extra = (wrapper,) if name == "claims" else ()
+                    for result in await scenario(client, args, *extra):
+                        results.append({"scenario": name, **result.as_dict()})
+                stats = tmux_summary((await client.get("/metrics")).text)
+    if args.json:
+        print(json.dumps({"results": results, "tmux": stats}, indent=2))
+        return
+    print_table(results)
+    print()
+    print("tmux commands (server side):")
+    for name, s in sorted(stats.items()):
+        print(f"  {name:<16} count={s['count']:<6} avg={s['avg_ms']}ms failures={s['failures']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"any of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--clients", type=int, default=10, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="seconds the fake tmux takes per command list")
+    parser.add_argument("--lines", type=int, default=5000, help="scrollback lines in the fake pane")
+    parser.add_argument("--poll-interval", type=float, default=0.05,
+                        help="seconds between /copy polls per client")
+    parser.add_argument("--uploads", type=int, default=4, help="parallel uploads")
+    parser.add_argument("--upload-size", type=int, default=20 * 1024 * 1024,
+                        help="bytes per upload (the server limit is 20 MB)")
+    parser.add_argument("--fork", action="store_true", help="fork tmux per command instead of control mode")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    args.clients = max(args.clients, 1)
+    asyncio.run(main(args))
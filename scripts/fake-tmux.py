@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Stand-in tmux binary for benchmarking the voice wrapper without tmux.
+
+Understands the subset of tmux the wrapper uses, both as a forked client
+(`tmux cmd args ; cmd args`) and in control mode (`tmux -C attach-session`).
+Every pane starts with a large generated scrollback. A forked client keeps
+no state between runs. A control-mode client keeps its panes for as long as
+it stays connected and reports changes with %output notifications.
+
+Configured through the environment:
+  FAKE_TMUX_SESSIONS  comma-separated session names (default "claude")
+  FAKE_TMUX_LINES     history lines per pane (default 5000)
+  FAKE_TMUX_WIDTH     characters per generated line (default 120)
+  FAKE_TMUX_ROWS      visible screen rows (default 50)
+  FAKE_TMUX_LATENCY   seconds added to every command list (default 0.002)
+"""
+
+import os
+import sys
+import time
+
+from typing import Optional
+
+SESSIONS = [s for s in os.environ.get("FAKE_TMUX_SESSIONS", "claude").split(",") if s]
+LINES = int(os.environ.get("FAKE_TMUX_LINES", "5000"))
+WIDTH = int(os.environ.get("FAKE_TMUX_WIDTH", "120"))
+ROWS = int(os.environ.get("FAKE_TMUX_ROWS", "50"))
+LATENCY = float(os.environ.get("FAKE_TMUX_LATENCY", "0.002"))
+
+START_TIME = 1700000000  # fixed: forked clients must agree on the "server" start
+
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit " * (WIDTH // 40 + 1)
+
+
+class TmuxError(Exception):
+    pass
+
+
+class Pane:
+    def __init__(self, pane_id: int, session: str):
+        self.pane_id = pane_id
+        self.session = session
+        self.lines = [f"{session} {i:06d} {FILLER}"[:WIDTH] for i in range(LINES + ROWS)]
+        self.lines.append("$ ")
+        self.activity = int(time.time())
+
+    @property
+    def history_size(self) -> int:
+        return max(len(self.lines) - ROWS, 0)
+
+    def write(self, text: str):
+        self.lines[-1] += text
+        self.activity = int(time.time())
+
+    def newline(self):
+        self.lines.append("")
+        if self.history_size > LINES:
+            # Like tmux, trim a tenth of the history limit at once
+            del self.lines[:max(LINES // 10, 1)]
+        self.activity = int(time.time())
+
+    def capture(self, start: str, end: str) -> list[str]:
+        def resolve(value: str, default: int) -> int:
+            if value == "-":
+                return default
+            return self.history_size + int(value)
+        first = max(resolve(start, 0), 0) if start else self.history_size
+        last = resolve(end, len(self.lines) - 1) if end else len(self.lines) - 1
+        return self.lines[first:last + 1]
+
+
+class Server:
+    def __init__(self):
+        self.panes = {name: Pane(i, name) for i, name in enumerate(SESSIONS)}
+
+    def pane(self, target: str) -> Pane:
+        if target.startswith("%"):
+            for pane in self.panes.values():
+                if f"%{pane.pane_id}" == target:
+                    return pane
+            raise TmuxError(f"can't find pane: {target}")
+        name = target.lstrip("=").split(":")[0].split(".")[0]
+        if name not in self.panes:
+            raise TmuxError(f"can't find session: {name}")
+        return self.panes[name]
+
+    def expand(self, fmt: str, pane: Pane) -> str:
+        values = {
+            "session_name": pane.session,
+            "session_windows": "1",
+            "session_attached": "1",  # the wrapper's control-mode client
+            "client_session": pane.session,
+            "client_control_mode": "1",
+            "session_activity": str(pane.activity),
+            "window_index": "0",
+            "window_name": "bash",
+            "window_active": "1",
+            "window_activity": str(pane.activity),
+            "pane_id": f"%{pane.pane_id}",
+            "pane_index": "0",
+            "pane_active": "1",
+            "pane_dead": "0",
+            "pane_current_command": "bash",
+            "pane_width": str(WIDTH),
+            "pane_height": str(ROWS),
+            "history_size": str(pane.history_size),
+            "history_limit": str(LINES),
+            "start_time": str(START_TIME),
+            "cursor_x": str(len(pane.lines[-1])),
+            "cursor_y": str(len(pane.lines) - 1 - pane.history_size),
+        }
+        for key, value in values.items():
+            fmt = fmt.replace("#{%s}" % key, value)
+        return fmt
+
+    def run(self, argv: list[str], default: str) -> tuple[list[str], Optional[Pane]]:
+        """Run one command; returns its output lines and the pane it changed."""
+        name, args = argv[0], argv[1:]
+        flags, positional, target = set(), [], default
+        options = {}
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg in ("-t", "-S", "-E", "-F", "-n", "-c") and i + 1 < len(args):
+                options[arg] = args[i + 1]
+                i += 2
+                continue
+            if arg.startswith("-") and len(arg) > 1 and not positional and name != "send-keys":
+                flags.update(arg[1:])
+            elif arg == "-l" and not positional:
+                flags.add("l")
+            else:
+                positional.append(arg)
+            i += 1
+        target = options.get("-t", target)
+        fmt = options.get("-F", "")
+
+        if name == "send-keys":
+            pane = self.pane(target)
+            if "l" in flags:
+                pane.write(" ".join(positional))
+            else:
+                for key in positional:
+                    if key == "Enter":
+                        pane.newline()
+                    elif len(key) == 1:
+                        pane.write(key)
+            return [], pane
+        if name == "capture-pane":
+            return self.pane(target).capture(options.get("-S", ""), options.get("-E", "")), None
+        if name == "display-message":
+            return [self.expand(positional[0] if positional else "", self.pane(target))], None
+        if name in ("list-sessions", "list-clients"):
+            return [self.expand(fmt, p) for p in self.panes.values()], None
+        if name in ("list-windows", "list-panes"):
+            panes = self.panes.values() if "a" in flags else [self.pane(target)]
+            return [self.expand(fmt, p) for p in panes], None
+        if name in ("select-window", "new-window", "kill-window", "has-session",
+                    "set-option", "set-hook", "refresh-client", "attach-session"):
+            self.pane(target)
+            return [], None
+        raise TmuxError(f"unknown command: {name}")
+
+
+def split_commands(argv: list[str]) -> list[list[str]]:
+    """Split command-line arguments on `;` the way tmux does."""
+    commands, current = [], []
+    for arg in argv:
+        if arg == ";":
+            commands.append(current)
+            current = []
+        elif arg.endswith("\\;"):
+            current.append(arg[:-2] + ";")
+        else:
+            current.append(arg)
+    commands.append(current)
+    return [c for c in commands if c]
+
+
+def parse_line(line: str) -> list[list[str]]:
+    """Tokenize a control-mode command line (double quotes, `;` separators)."""
+    escapes = {"n": "\n", "t": "\t", "\\": "\\", '"': '"', "$": "$"}
+    commands, current, token, quoted = [], [], None, False
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        if quoted:
+            if ch == "\\" and i + 1 < len(line):
+                nxt = line[i + 1]
+                if nxt in "01234567":
+                    token += chr(int(line[i + 1:i + 4], 8))
+                    i += 4
+                    continue
+                token += escapes.get(nxt, nxt)
+                i += 2
+                continue
+            if ch == '"':
+                quoted = False
+            else:
+                token += ch
+        elif ch == '"':
+            quoted, token = True, token or ""
+        elif ch in " \t":
+            if token is not None:
+                current.append(token)
+                token = None
+        elif ch == ";" and token is None:
+            commands.append(current)
+            current = []
+        else:
+            token = (token or "") + ch
+        i += 1
+    if token is not None:
+        current.append(token)
+    commands.append(current)
+    return [c for c in commands if c]
+
+
+def control_mode(server: Server, session: str):
+    """Answer command lines on stdin with %begin/%end blocks until EOF."""
+    out = sys.stdout
+    number = 0
+
+    def block(lines: list[str], ok: bool, flags: int = 1):
+        nonlocal number
+        number += 1
+        stamp = int(time.time())
+        out.write(f"%begin {stamp} {number} {flags}\n")
+        for line in lines:
+            out.write(line + "\n")
+        out.write(f"%{'end' if ok else 'error'} {stamp} {number} {flags}\n")
+
+    block([], True, flags=0)
+    out.write(f"%session-changed ${SESSIONS.index(session)} {session}\n")
+    out.flush()
+    for line in sys.stdin:
+        if LATENCY:
+            time.sleep(LATENCY)
+        changed = []
+        for argv in parse_line(line.rstrip("\n")):
+            try:
+                lines, pane = server.run(argv, session)
+            except (TmuxError, IndexError, ValueError) as e:
+                block([str(e)], False)
+                break
+            block(lines, True)
+            if pane is not None:
+                changed.append(pane)
+        for pane in changed:
+            out.write(f"%output %{pane.pane_id} {pane.lines[-1][-16:]}\n")
+        out.flush()
+
+
+def main(argv: list[str]) -> int:
+    control = False
+    while argv and argv[0].startswith("-") and argv[0] != "-":
+        opt = argv.pop(0)
+        if "C" in opt:
+            control = True
+        if opt in ("-L", "-S", "-f") and argv:
+            argv.pop(0)
+    server = Server()
+    if control:
+        target = argv[argv.index("-t") + 1].lstrip("=") if "-t" in argv else SESSIONS[0]
+        if target not in server.panes:
+            print(f"can't find session: {target}", file=sys.stderr)
+            return 1
+        control_mode(server, target)
+        return 0
+    if LATENCY:
+        time.sleep(LATENCY)
+    default = SESSIONS[0] if SESSIONS else ""
+    for command in split_commands(argv):
+        try:
+            lines, _ = server.run(command, default)
+        except (TmuxError, IndexError, ValueError) as e:
+            print(e, file=sys.stderr)
+            return 1
+        for line in lines:
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
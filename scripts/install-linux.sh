@@ -41,11 +41,11 @@ echo
 
 # Install Python packages
 echo "Installing Python packages (fastapi, uvicorn, python-multipart)..."
-if pip3 install --break-system-packages fastapi uvicorn python-multipart 2>/dev/null; then
+if pip3 install --break-system-packages fastapi uvicorn python-multipart websockets 2>/dev/null; then
     true
 else
     echo "Retrying without --break-system-packages..."
-    pip3 install fastapi uvicorn python-multipart
+    pip3 install fastapi uvicorn python-multipart websockets
 fi
 echo
 
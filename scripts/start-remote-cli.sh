@@ -30,102 +30,60 @@ export TMUX_SESSION="${1:-claude}"
 echo "Tailscale IP: $TAILSCALE_IP"
 echo "tmux session: $TMUX_SESSION"
 
-# Kill any existing ttyd processes
+# Kill any existing wrapper, ttyd and sleep inhibitor processes
+pkill -f "voice-wrapper" 2>/dev/null || true
 pkill -f "ttyd" 2>/dev/null || true
-sleep 1
-
-# Keep machine awake: caffeinate on macOS, systemd-inhibit on Linux
 if [ "$OS" = "Darwin" ]; then
     pkill -f "caffeinate" 2>/dev/null || true
-    # Only inhibit sleep while on AC power; battery → normal sleep
-    (while kill -0 $$ 2>/dev/null; do
-        if pmset -g ps | head -1 | grep -q "AC Power"; then
-            caffeinate -i -s -t 30 2>/dev/null
-        else
-            sleep 30
-        fi
-    done) &
-    INHIBIT_PID=$!
-    echo "sleep inhibitor running (PID: $INHIBIT_PID, AC-only)"
 else
-    if command -v systemd-inhibit >/dev/null 2>&1; then
-        systemd-inhibit --what=idle --who="remote-cli" --why="Keeping machine awake for remote CLI" sleep infinity &
-        INHIBIT_PID=$!
-        echo "systemd-inhibit running (PID: $INHIBIT_PID)"
-    else
-        echo "WARNING: No sleep inhibitor available (caffeinate/systemd-inhibit not found), skipping"
-        INHIBIT_PID=""
-    fi
+    pkill -f "systemd-inhibit.*remote-cli" 2>/dev/null || true
 fi
+sleep 1
 
-# Start ttyd bound to Tailscale IP only
-# Uses tmux-attach.sh wrapper for clean argument handling
-ttyd \
-    --port 7681 \
-    --interface "$TAILSCALE_IP" \
-    --writable \
-    -t fontSize=14 \
-    -t lineHeight=1.2 \
-    -t cursorBlink=true \
-    -t cursorStyle=block \
-    -t scrollback=10000 \
-    -t scrollSensitivity=3 \
-    -t fastScrollSensitivity=10 \
-    -t smoothScrollDuration=100 \
-    -t 'fontFamily="Menlo, Monaco, Consolas, monospace, Apple Color Emoji, Segoe UI Emoji"' \
-    "$SCRIPT_DIR/tmux-attach.sh" \
-    >> "$LOG_DIR/ttyd.log" 2>&1 &
-
-TTYD_PID=$!
-echo "ttyd running (PID: $TTYD_PID) on http://$TAILSCALE_IP:7681"
+# The voice wrapper supervises ttyd and the sleep inhibitor (caffeinate on
+# AC power on macOS, systemd-inhibit on Linux), restarting them with
+# backoff; their logs and PID files go to $LOG_DIR. See /health.
+export SUPERVISE=1
+export SUPERVISOR_LOG_DIR="$LOG_DIR"
 
-# Start voice dictation wrapper
-pkill -f "voice-wrapper" 2>/dev/null || true
-python3 "$SCRIPT_DIR/voice-wrapper.py" >> "$LOG_DIR/voice-wrapper.log" 2>&1 &
-WRAPPER_PID=$!
-echo "voice wrapper running (PID: $WRAPPER_PID) on http://$TAILSCALE_IP:8080"
+# Keep scrollback older than tmux's history-limit, compressed on disk
+export ARCHIVE_DIR="${ARCHIVE_DIR:-$LOG_DIR/archive}"
 
 echo ""
 echo "=== Remote CLI Ready ==="
 echo "Terminal:  http://$TAILSCALE_IP:7681"
 echo "Voice UI:  http://$TAILSCALE_IP:8080"
+echo "Health:    http://$TAILSCALE_IP:8080/health"
 echo ""
 echo "Open the Voice UI URL in Chrome on your iPhone (Tailscale must be active)."
 echo "To stop: $SCRIPT_DIR/stop-remote-cli.sh"
 
-# Save PIDs for stop script (including this watchdog parent)
+# Save PID for stop script (this watchdog parent)
 echo "$$" > "$LOG_DIR/watchdog.pid"
-echo "$TTYD_PID" > "$LOG_DIR/ttyd.pid"
-[ -n "$INHIBIT_PID" ] && echo "$INHIBIT_PID" > "$LOG_DIR/inhibit.pid"
-echo "$WRAPPER_PID" > "$LOG_DIR/voice-wrapper.pid"
 
-# Watchdog: restart ttyd if it crashes, exit cleanly on SIGTERM
+# Watchdog: restart the wrapper if it crashes, exit cleanly on SIGTERM
 KEEP_RUNNING=true
-trap 'KEEP_RUNNING=false; kill $TTYD_PID 2>/dev/null' TERM INT
+WRAPPER_PID=""
+trap 'KEEP_RUNNING=false; [ -n "$WRAPPER_PID" ] && kill $WRAPPER_PID 2>/dev/null' TERM INT
 
 while $KEEP_RUNNING; do
-    wait $TTYD_PID 2>/dev/null || true
+    python3 "$SCRIPT_DIR/voice-wrapper.py" >> "$LOG_DIR/voice-wrapper.log" 2>&1 &
+    WRAPPER_PID=$!
+    echo "$WRAPPER_PID" > "$LOG_DIR/voice-wrapper.pid"
+    echo "[$(date)] voice wrapper running (PID: $WRAPPER_PID)" >> "$LOG_DIR/voice-wrapper.log"
+    wait $WRAPPER_PID 2>/dev/null || true
     if ! $KEEP_RUNNING; then
+        # wait returns as soon as the trap fires; let the wrapper stop its children
+        wait $WRAPPER_PID 2>/dev/null || true
         break
     fi
-    echo "[$(date)] ttyd exited, restarting in 5s..." >> "$LOG_DIR/ttyd.log"
-    sleep 5
-    ttyd \
-        --port 7681 \
-        --interface "$TAILSCALE_IP" \
-        --writable \
-        -t fontSize=14 \
-        -t lineHeight=1.2 \
-        -t cursorBlink=true \
-        -t cursorStyle=block \
-        -t scrollback=10000 \
-        -t scrollSensitivity=3 \
-        -t fastScrollSensitivity=10 \
-        -t smoothScrollDuration=100 \
-        -t 'fontFamily="Menlo, Monaco, Consolas, monospace, Apple Color Emoji, Segoe UI Emoji"' \
-        "$SCRIPT_DIR/tmux-attach.sh" \
-        >> "$LOG_DIR/ttyd.log" 2>&1 &
-    TTYD_PID=$!
-    echo "$TTYD_PID" > "$LOG_DIR/ttyd.pid"
-    echo "[$(date)] ttyd restarted (PID: $TTYD_PID)" >> "$LOG_DIR/ttyd.log"
+    # A wrapper that died hard can't have stopped its children
+    for name in ttyd inhibit; do
+        if [ -f "$LOG_DIR/$name.pid" ]; then
+            kill "$(cat "$LOG_DIR/$name.pid")" 2>/dev/null || true
+            rm -f "$LOG_DIR/$name.pid"
+        fi
+    done
+    echo "[$(date)] voice wrapper exited, restarting in 1s..." >> "$LOG_DIR/voice-wrapper.log"
+    sleep 1
 done
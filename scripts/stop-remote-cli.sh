@@ -7,7 +7,7 @@ LOG_DIR="$PROJECT_DIR/logs"
 
 echo "Stopping remote CLI services..."
 
-# Stop watchdog first so it doesn't respawn ttyd
+# Stop watchdog first so it doesn't respawn the voice wrapper
 if [ -f "$LOG_DIR/watchdog.pid" ]; then
     kill "$(cat "$LOG_DIR/watchdog.pid")" 2>/dev/null && echo "watchdog stopped" || echo "watchdog was not running"
     rm -f "$LOG_DIR/watchdog.pid"
@@ -15,7 +15,25 @@ else
     pkill -f "start-remote-cli" 2>/dev/null && echo "watchdog stopped" || true
 fi
 
-# Stop ttyd
+# Stop voice wrapper next: it supervises ttyd and would restart it
+if [ -f "$LOG_DIR/voice-wrapper.pid" ]; then
+    WRAPPER_PID="$(cat "$LOG_DIR/voice-wrapper.pid")"
+    if kill "$WRAPPER_PID" 2>/dev/null; then
+        # Give it a moment to stop ttyd and the sleep inhibitor itself
+        for _ in 1 2 3 4 5; do
+            kill -0 "$WRAPPER_PID" 2>/dev/null || break
+            sleep 1
+        done
+        echo "voice wrapper stopped"
+    else
+        echo "voice wrapper was not running"
+    fi
+    rm -f "$LOG_DIR/voice-wrapper.pid"
+else
+    pkill -f "voice-wrapper" 2>/dev/null && echo "voice wrapper stopped" || echo "voice wrapper was not running"
+fi
+
+# Stop ttyd, in case the wrapper didn't
 if [ -f "$LOG_DIR/ttyd.pid" ]; then
     kill "$(cat "$LOG_DIR/ttyd.pid")" 2>/dev/null && echo "ttyd stopped" || echo "ttyd was not running"
     rm -f "$LOG_DIR/ttyd.pid"
@@ -23,14 +41,6 @@ else
     pkill -f "ttyd" 2>/dev/null && echo "ttyd stopped" || echo "ttyd was not running"
 fi
 
-# Stop voice wrapper
-if [ -f "$LOG_DIR/voice-wrapper.pid" ]; then
-    kill "$(cat "$LOG_DIR/voice-wrapper.pid")" 2>/dev/null && echo "voice wrapper stopped" || echo "voice wrapper was not running"
-    rm -f "$LOG_DIR/voice-wrapper.pid"
-else
-    pkill -f "voice-wrapper" 2>/dev/null && echo "voice wrapper stopped" || echo "voice wrapper was not running"
-fi
-
 # Stop sleep inhibitor (caffeinate on macOS, systemd-inhibit on Linux)
 if [ -f "$LOG_DIR/inhibit.pid" ]; then
     kill "$(cat "$LOG_DIR/inhibit.pid")" 2>/dev/null && echo "sleep inhibitor stopped" || echo "sleep inhibitor was not running"
@@ -9,8 +9,11 @@ unset CLAUDE_CODE_ENV_VERSION
 export LANG="en_US.UTF-8"
 export LC_ALL="en_US.UTF-8"
 
-# Session name from env var or default to "claude"
+# Session name from ttyd's ?arg= (--url-arg), then env var, then "claude"
 SESSION="${TMUX_SESSION:-claude}"
+if [[ "${1:-}" =~ ^[A-Za-z0-9_-]{1,64}$ ]]; then
+    SESSION="$1"
+fi
 
 # Detect tmux binary: command -v first, then OS-specific fallback
 if TMUX_BIN=$(command -v tmux 2>/dev/null); then
@@ -6,21 +6,61 @@ field at the bottom. Dictation works in the native input, then text is
 injected into the tmux session via `tmux send-keys`.
 """
 
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import contextvars
+import gzip
+import hashlib
+import json
+import mmap
+import multiprocessing
 import os
 import platform
 import re
 import subprocess
 import shutil
+import struct
+import tempfile
+import threading
 import time
+import urllib.parse
 import uuid
+import zlib
 
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Callable, NamedTuple, Optional, Union
 
-from fastapi import FastAPI, Request, UploadFile, File
-from fastapi.responses import HTMLResponse
+from fastapi import (
+    Depends, FastAPI, File, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect,
+)
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+try:
+    import httpx
+except ImportError:  # optional: only needed to reach PEERS
+    httpx = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: uploads are stored as-is without Pillow
+    Image = ImageOps = None
+else:
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
 def _find_binary(name: str, macos_fallback: str, linux_fallback: str) -> str:
     """Locate a binary by name, falling back to an OS-specific path."""
     found = shutil.which(name)
@@ -32,20 +72,307 @@ def _find_binary(name: str, macos_fallback: str, linux_fallback: str) -> str:
 
 
 TMUX = _find_binary("tmux", "/opt/homebrew/bin/tmux", "/usr/bin/tmux")
+TTYD = _find_binary("ttyd", "/opt/homebrew/bin/ttyd", "/usr/bin/ttyd")
 TAILSCALE = _find_binary(
     "tailscale",
     "/Applications/Tailscale.app/Contents/MacOS/Tailscale",
     "/usr/bin/tailscale",
 )
 TTYD_PORT = 7681
-WRAPPER_PORT = 8080
+WRAPPER_HOST = os.environ.get("WRAPPER_HOST", "")  # default: the Tailscale IP
+WRAPPER_PORT = int(os.environ.get("WRAPPER_PORT", "8080"))
 TMUX_SESSION = os.environ.get("TMUX_SESSION", "claude")
+TMUX_TIMEOUT = float(os.environ.get("TMUX_TIMEOUT", "5"))
+TMUX_CONCURRENCY = int(os.environ.get("TMUX_CONCURRENCY", "8"))
+TMUX_CONTROL = os.environ.get("TMUX_CONTROL", "1") != "0"
+BOOT_ID = uuid.uuid4().hex[:8]  # keeps ETags from matching across restarts
+
+
+TAILSCALE_WATCH_INTERVAL = float(os.environ.get("TAILSCALE_WATCH_INTERVAL", "30"))
+
+# ── lifecycle hooks ─────────────────────────────────────────────────────
+_startup_hooks: list[Callable] = []
+_shutdown_hooks: list[Callable] = []
+_background_tasks: list[asyncio.Task] = []
+
+
+def on_startup(fn):
+    _startup_hooks.append(fn)
+    return fn
+
+
+def on_shutdown(fn):
+    _shutdown_hooks.append(fn)
+    return fn
+
+
+def background_task(fn):
+    """Run a long-lived coroutine function for the lifetime of the app."""
+    @on_startup
+    async def start():
+        _background_tasks.append(asyncio.get_running_loop().create_task(fn()))
+    return fn
+
+
+@asynccontextmanager
+async def lifespan(app):
+    for hook in _startup_hooks:
+        await hook()
+    try:
+        yield
+    finally:
+        for task in _background_tasks:
+            task.cancel()
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+        _background_tasks.clear()
+        for hook in reversed(_shutdown_hooks):
+            await hook()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# ── metrics ─────────────────────────────────────────────────────────────
+# Prometheus text format at /metrics, hand-rolled so nothing extra needs
+# installing. Labels are route templates and tmux subcommand names, never
+# raw paths or arguments, so the number of series stays small.
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") != "0"
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+RATE_BUCKETS = (1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+_metrics: list["Metric"] = []
+
+
+def _metric_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _metric_labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_label_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _label_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = "voice_wrapper_" + name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, object] = {}
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _pairs(self, key: tuple) -> list[tuple[str, str]]:
+        return list(zip(self.labels, key))
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.values.items():
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_metric_labels(self._pairs(key))} {_metric_value(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        if not labels:
+            self.values[()] = 0
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            # [per-bucket counts (+Inf last), sum, count]
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def _samples(self, key: tuple, value) -> list[str]:
+        counts, total, count = value
+        pairs = self._pairs(key)
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = _metric_value(bound)
+            lines.append(f"{self.name}_bucket{_metric_labels(pairs + [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{_metric_labels(pairs)} {_metric_value(total)}")
+        lines.append(f"{self.name}_count{_metric_labels(pairs)} {count}")
+        return lines
+
+
+http_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from request to response headers, by route template.",
+    ("method", "route", "status"))
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests being handled (includes open streams).")
+websocket_open = Gauge("websocket_connections", "Open WebSocket connections.")
+tmux_duration = Histogram(
+    "tmux_command_duration_seconds",
+    "tmux command list latency, by first subcommand and transport.",
+    ("command", "transport"))
+tmux_failures = Counter("tmux_command_failures_total", "Failed tmux command lists.", ("command", "reason"))
+tmux_control_connects = Counter(
+    "tmux_control_connects_total", "Control-mode connections made, by tmux session.", ("session",))
+loop_lag = Gauge("event_loop_lag_seconds", "Most recent event loop scheduling delay.")
+loop_lag_hist = Histogram("event_loop_lag_distribution_seconds", "Event loop scheduling delay.")
+upload_bytes = Counter("upload_bytes_total", "Bytes received by upload endpoints.")
+uploads = Counter("uploads_total", "Uploads by outcome.", ("result",))
+upload_duration = Histogram("upload_duration_seconds", "Time to receive and store one upload.")
+upload_rate = Histogram(
+    "upload_throughput_bytes_per_second", "Receive rate of each upload.", buckets=RATE_BUCKETS)
+copy_payload = Histogram(
+    "copy_payload_bytes", "Uncompressed /copy response size.", ("mode",), buckets=SIZE_BUCKETS)
+session_claims = Counter("session_claims_total", "Device claims, by tmux session.", ("session",))
+session_takeovers = Counter(
+    "session_takeovers_total", "Claims that kicked another device, by tmux session.", ("session",))
+process_restarts = Counter(
+    "process_restarts_total", "Restarts of supervised processes, by process.", ("process",))
+peer_duration = Histogram(
+    "peer_request_duration_seconds", "Requests to peer wrappers, by peer and outcome.",
+    ("peer", "result"))
+
+# Per-request accumulated timings for the Server-Timing header
+_request_timings: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "request_timings", default=None)
+
+
+def add_timing(name: str, elapsed: float):
+    """Attribute time spent on `name` to the current request, if any."""
+    timings = _request_timings.get()
+    if timings is not None:
+        total, calls = timings.get(name, (0.0, 0))
+        timings[name] = (total + elapsed, calls + 1)
+
+
+class MetricsMiddleware:
+    """Per-route latency and in-flight counts, plus the Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            websocket_open.inc()
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                websocket_open.dec()
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        timings: dict = {}
+        token = _request_timings.set(timings)
+        status = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            recorded = True
+            route = scope.get("route")
+            http_duration.observe(
+                time.perf_counter() - start, method=scope["method"],
+                route=route.path if route is not None else "unmatched", status=status)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    entries = [
+                        f'{name};dur={total * 1000:.1f};desc="{calls} calls"'
+                        for name, (total, calls) in timings.items()
+                    ]
+                    entries.append(f"app;dur={(time.perf_counter() - start) * 1000:.1f}")
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", ", ".join(entries).encode()))
+                    message = {**message, "headers": headers}
+                record()
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            _request_timings.reset(token)
+            if not recorded:
+                record()
+
+
+app.add_middleware(MetricsMiddleware)
+
+
+@background_task
+async def measure_loop_lag():
+    """Sleep for a fixed interval and record how late the loop woke us."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+        loop_lag.set(lag)
+        loop_lag_hist.observe(lag)
 
 
-app = FastAPI()
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus text exposition of every metric above."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    body = ("\n".join(lines) + "\n").encode()
+    return encoded_response(request, body, "text/plain; version=0.0.4; charset=utf-8")
 
-# ── session claim state (last device wins) ──────────────────────────────
-active_session = {"id": None, "device": None, "claimed_at": 0}
+# ── session claim state (last device wins), per tmux session ─────────────
+active_sessions: dict[str, dict] = {}
+
+
+def claim_state(session: str) -> dict:
+    return active_sessions.setdefault(session, {"id": None, "device": None, "claimed_at": 0})
 
 
 def get_tailscale_ip():
@@ -55,6 +382,523 @@ def get_tailscale_ip():
     return result.stdout.strip()
 
 
+# ── async command execution ─────────────────────────────────────────────
+# Route handlers all share one event loop, so tmux must never be run via
+# the blocking subprocess.run from inside them.
+
+class CommandResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class CommandTimeout(Exception):
+    """Raised when an external command exceeds its timeout."""
+
+
+_tmux_slots: Optional[asyncio.Semaphore] = None
+
+
+async def run_command(argv: list[str], timeout: float) -> CommandResult:
+    """Run a command without blocking the event loop."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        return CommandResult(127, "", str(e))
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise CommandTimeout(f"{Path(argv[0]).name} timed out after {timeout}s")
+    return CommandResult(
+        proc.returncode,
+        stdout.decode("utf-8", "replace"),
+        stderr.decode("utf-8", "replace"),
+    )
+
+
+# Worker processes are spawned, not forked from a process full of threads
+# and an event loop. Each loads this file under the parent's module name,
+# so functions defined here unpickle even when the wrapper was loaded with
+# importlib (as scripts/benchmark.py does) rather than run as a script.
+_WORKER_INIT = """
+import importlib.util, sys
+if {name!r} not in sys.modules:
+    spec = importlib.util.spec_from_file_location({name!r}, {path!r})
+    module = sys.modules[{name!r}] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+"""
+
+
+def spawned_workers() -> dict:
+    """Process pool arguments for spawned workers that can import this file."""
+    return {
+        "initializer": exec,
+        "initargs": (_WORKER_INIT.format(name=__name__, path=__file__), {}),
+    }
+
+
+# ── tmux control mode ───────────────────────────────────────────────────
+# One long-lived `tmux -C` client per session. Commands are written to its
+# stdin as lines and tmux answers each command with a %begin/%end (or
+# %error) block, in order, so replies are matched to callers FIFO.
+
+class ControlConnectionError(Exception):
+    """The control-mode client is not (or no longer) connected."""
+
+
+def _control_quote(arg: str) -> str:
+    """Quote an argument for the tmux command parser.
+
+    `~` is escaped too: tmux expands a leading one to $HOME even inside
+    double quotes.
+    """
+    out = []
+    for ch in arg:
+        if ch in '\\"$~':
+            out.append("\\" + ch)
+        elif ch == "\n":
+            out.append("\\n")
+        elif ch == "\t":
+            out.append("\\t")
+        elif ord(ch) < 0x20 or ord(ch) == 0x7F:
+            out.append("\\%03o" % ord(ch))
+        else:
+            out.append(ch)
+    return '"' + "".join(out) + '"'
+
+
+class TmuxControl:
+    """A pipelined `tmux -C attach` connection to one session."""
+
+    RETRY_MIN = 0.5
+    RETRY_MAX = 10.0
+
+    def __init__(self, session: str):
+        self.session = session
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.output_seq = 0  # bumped on every %output notification
+        # Called with every notification line (%output, %window-add, ...)
+        self.listeners: list[Callable[[str], None]] = []
+        # Each entry: [commands expected, results so far, future]
+        self._pending: collections.deque = collections.deque()
+        self._lock: Optional[asyncio.Lock] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._retry_at = 0.0
+        self._retry_delay = self.RETRY_MIN
+
+    @property
+    def connected(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def ensure_connected(self):
+        if self.connected:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.connected:
+                return
+            if time.monotonic() < self._retry_at:
+                raise ControlConnectionError("waiting to reconnect")
+            try:
+                await self._connect()
+            except (OSError, ControlConnectionError, asyncio.TimeoutError) as e:
+                self._retry_at = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, self.RETRY_MAX)
+                raise ControlConnectionError(str(e) or "connect failed") from e
+            self._retry_delay = self.RETRY_MIN
+
+    async def _connect(self):
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self.proc = await asyncio.create_subprocess_exec(
+            TMUX, "-C", "attach-session", "-t", f"={self.session}",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=16 * 1024 * 1024,
+        )
+        loop.create_task(self._read_loop(self.proc, self._ready))
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), TMUX_TIMEOUT)
+        except BaseException:
+            self._kill()
+            raise
+        tmux_control_connects.inc(session=self.session)
+
+    def _kill(self):
+        if self.connected:
+            self.proc.kill()
+
+    async def _read_loop(self, proc, ready):
+        block = None  # (command number, from this client, lines)
+        error_text = ""
+        try:
+            while True:
+                raw = await proc.stdout.readline()
+                if not raw:
+                    break
+                line = raw.decode("utf-8", "replace").rstrip("\n")
+                if block is not None:
+                    num, ours, lines = block
+                    if line.startswith(("%end ", "%error ")) and line.split(" ")[2:3] == [num]:
+                        block = None
+                        failed = line.startswith("%error")
+                        if not ours:
+                            if failed:
+                                error_text = "\n".join(lines)
+                            continue
+                        if not ready.done():
+                            ready.set_result(None)
+                        self._deliver(lines, failed)
+                    else:
+                        lines.append(line)
+                    continue
+                if line.startswith("%output "):
+                    self.output_seq += 1
+                elif line.startswith("%begin "):
+                    parts = line.split(" ")
+                    block = (parts[2], len(parts) > 3 and int(parts[3]) & 1 == 1, [])
+                elif line.startswith("%session-changed") and not ready.done():
+                    ready.set_result(None)
+                elif line.startswith("%exit"):
+                    error_text = error_text or line
+                for listener in list(self.listeners):
+                    listener(line)
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+            if not ready.done():
+                ready.set_exception(ControlConnectionError(error_text or "tmux exited"))
+            if self.proc is proc:
+                self.proc = None
+            while self._pending:
+                fut = self._pending.popleft()[2]
+                if not fut.done():
+                    fut.set_exception(ControlConnectionError("tmux control connection lost"))
+
+    def _deliver(self, lines: list[str], failed: bool):
+        if not self._pending:
+            return
+        entry = self._pending[0]
+        text = "\n".join(lines) + "\n" if lines else ""
+        if failed:
+            entry[1].append(CommandResult(1, "", text))
+        else:
+            entry[1].append(CommandResult(0, text, ""))
+        # tmux abandons the rest of a command line after an error
+        if failed or len(entry[1]) == entry[0]:
+            self._pending.popleft()
+            if not entry[2].done():
+                entry[2].set_result(entry[1])
+
+    async def run(self, commands: list[tuple[str, ...]], timeout: float) -> list[CommandResult]:
+        """Run commands as one tmux command line; returns a result per command run.
+
+        Raises ControlConnectionError only if nothing was sent, so callers
+        can safely retry by other means.
+        """
+        await self.ensure_connected()
+        line = " ; ".join(" ".join(_control_quote(a) for a in cmd) for cmd in commands)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append([len(commands), [], fut])
+        try:
+            self.proc.stdin.write(line.encode("utf-8") + b"\n")
+        except (AttributeError, ConnectionError) as e:
+            self._pending.pop()
+            raise ControlConnectionError("tmux control connection lost") from e
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            raise CommandTimeout(f"tmux control command timed out after {timeout}s")
+        except ControlConnectionError as e:
+            # Sent but unanswered: don't retry, the command may have run
+            return [CommandResult(1, "", str(e))]
+
+    async def close(self):
+        if self.connected:
+            self.proc.stdin.close()
+            try:
+                await asyncio.wait_for(self.proc.wait(), 2)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+
+
+_control_clients: dict[str, TmuxControl] = {}
+
+
+@on_shutdown
+async def close_control_clients():
+    await asyncio.gather(*(c.close() for c in _control_clients.values()))
+
+
+def control_client(session: str = TMUX_SESSION) -> TmuxControl:
+    client = _control_clients.get(session)
+    if client is None:
+        client = _control_clients[session] = TmuxControl(session)
+    return client
+
+
+def _argv_escape(arg: str) -> str:
+    # On the command line tmux treats a trailing ";" as a command separator
+    return arg[:-1] + "\\;" if arg.endswith(";") else arg
+
+
+async def tmux_sequence(*commands: tuple[str, ...], timeout: Optional[float] = None,
+                        session: str = TMUX_SESSION) -> list[CommandResult]:
+    """Run tmux commands as one `a ; b ; c` command list.
+
+    tmux executes the list in one go, so no other client's commands can
+    land in between, and it stops at the first failing command. Returns a
+    result per command that ran. Over control mode each command gets its
+    own result; a forked client only reports overall success, so that
+    result is repeated for every command.
+
+    Goes over `session`'s control-mode connection when it is available
+    and falls back to forking a tmux client, bounded by TMUX_CONCURRENCY.
+    """
+    global _tmux_slots
+    timeout = timeout or TMUX_TIMEOUT
+    name = commands[0][0]
+    transport = "control"
+    start = time.perf_counter()
+
+    def record(ok: bool, timed_out: bool = False):
+        elapsed = time.perf_counter() - start
+        tmux_duration.observe(elapsed, command=name, transport=transport)
+        if not ok:
+            tmux_failures.inc(command=name, reason="timeout" if timed_out else "error")
+        add_timing("tmux", elapsed)
+
+    try:
+        if TMUX_CONTROL:
+            try:
+                results = await control_client(session).run(list(commands), timeout)
+                record(len(results) == len(commands) and results[-1].returncode == 0)
+                return results
+            except ControlConnectionError:
+                start = time.perf_counter()
+        transport = "fork"
+        argv = [TMUX]
+        for i, command in enumerate(commands):
+            if i:
+                argv.append(";")
+            argv.extend(_argv_escape(a) for a in command)
+        if _tmux_slots is None:
+            # Created lazily so it binds to the running loop (Python 3.9)
+            _tmux_slots = asyncio.Semaphore(TMUX_CONCURRENCY)
+        async with _tmux_slots:
+            result = await run_command(argv, timeout)
+    except CommandTimeout:
+        record(False, timed_out=True)
+        raise
+    record(result.returncode == 0)
+    return [result] * len(commands)
+
+
+async def tmux(*args: str, timeout: Optional[float] = None,
+               session: str = TMUX_SESSION) -> CommandResult:
+    """Run a single tmux subcommand."""
+    return (await tmux_sequence(args, timeout=timeout, session=session))[0]
+
+
+async def fetch_tailscale_ip() -> str:
+    result = await run_command([TAILSCALE, "ip", "-4"], timeout=5)
+    return result.stdout.strip()
+
+
+@app.exception_handler(CommandTimeout)
+async def command_timeout_handler(request: Request, exc: CommandTimeout):
+    return JSONResponse(status_code=504, content={"error": str(exc)})
+
+
+# ── response encoding ───────────────────────────────────────────────────
+
+MIN_COMPRESS_SIZE = 1024
+
+
+def accepted_encodings(request: Request) -> set[str]:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.lower())
+    return accepted
+
+
+def compress(body: bytes, encoding: str, level: int = 6) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=min(level + 3, 11))
+    return gzip.compress(body, compresslevel=level)
+
+
+def encoded_response(request: Request, body: bytes, media_type: str,
+                     headers: Optional[dict] = None) -> Response:
+    """Build a response, compressed with brotli or gzip if the client allows."""
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) >= MIN_COMPRESS_SIZE:
+        accepted = accepted_encodings(request)
+        encoding = "br" if brotli is not None and "br" in accepted else (
+            "gzip" if "gzip" in accepted else None)
+        if encoding:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    candidates = request.headers.get("if-none-match", "")
+    return any(c.strip().removeprefix("W/") == etag for c in candidates.split(","))
+
+
+# ── server-sent events ──────────────────────────────────────────────────
+
+SSE_KEEPALIVE = 15.0
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data, event_id: Optional[str] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """One subscriber's queue on a Broadcaster; use as a context manager."""
+
+    def __init__(self, broadcaster: "Broadcaster"):
+        self._broadcaster = broadcaster
+        self.queue: asyncio.Queue = asyncio.Queue(broadcaster.maxsize)
+        broadcaster._queues.add(self.queue)
+
+    async def get(self, timeout: float = SSE_KEEPALIVE):
+        """Next published event, or None after `timeout` idle seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._broadcaster._queues.discard(self.queue)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Broadcaster:
+    """Fan published events out to every current subscriber."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._queues: set[asyncio.Queue] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._queues)
+
+    def publish(self, event):
+        for queue in self._queues:
+            if queue.full():
+                # A stalled subscriber loses its oldest events, not new ones
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscribe(self) -> Subscription:
+        return Subscription(self)
+
+
+# ── session routing ─────────────────────────────────────────────────────
+# Every endpoint takes an optional `?session=` naming the tmux session it
+# acts on, defaulting to TMUX_SESSION, so one wrapper serves them all.
+
+SESSION_NAME_RE = re.compile(r"^[\w\-]{1,64}$")
+SESSIONS_CACHE_TTL = 2.0
+
+
+async def session_param(session: Optional[str] = None) -> str:
+    """Dependency resolving the `session` query parameter.
+
+    Names other than TMUX_SESSION must be live tmux sessions, so per-session
+    state (control clients, claims, mirrors) only exists for real ones.
+    """
+    if not session or session == TMUX_SESSION:
+        return TMUX_SESSION
+    if not SESSION_NAME_RE.match(session):
+        raise HTTPException(status_code=400, detail="invalid session name")
+    if not any(s["name"] == session for s in await list_tmux_sessions()):
+        raise HTTPException(status_code=404, detail="no such session")
+    return session
+
+
+_sessions_cache = {"at": 0.0, "sessions": []}
+_sessions_lock: Optional[asyncio.Lock] = None
+
+
+async def list_tmux_sessions() -> list[dict]:
+    """All tmux sessions, from one list-sessions call cached briefly."""
+    global _sessions_lock
+    if _sessions_lock is None:
+        _sessions_lock = asyncio.Lock()
+    async with _sessions_lock:
+        if time.monotonic() - _sessions_cache["at"] < SESSIONS_CACHE_TTL:
+            return _sessions_cache["sessions"]
+        result, clients = await asyncio.gather(
+            tmux("list-sessions", "-F",
+                 "#{session_name}|#{session_windows}|#{session_attached}|#{session_activity}"),
+            tmux("list-clients", "-F", "#{client_session}|#{client_control_mode}"),
+        )
+        # Control-mode clients (the wrapper's own connections) aren't people
+        control = collections.Counter(
+            line.rpartition("|")[0] for line in clients.stdout.splitlines() if line.endswith("|1"))
+        sessions = []
+        for line in result.stdout.splitlines():
+            parts = line.split("|")
+            if len(parts) < 4:
+                continue
+            sessions.append({
+                "name": parts[0], "windows": int(parts[1]),
+                "attached": max(int(parts[2]) - control[parts[0]], 0), "activity": int(parts[3]),
+            })
+        _sessions_cache.update(at=time.monotonic(), sessions=sessions)
+        forget_closed_sessions({s["name"] for s in sessions})
+        return sessions
+
+
+def forget_closed_sessions(names: set[str]):
+    """Drop the per-session state of sessions that no longer exist."""
+    loop = asyncio.get_running_loop()
+    for name in [n for n in _control_clients if n not in names]:
+        loop.create_task(_control_clients.pop(name).close())
+    for name in [n for n in active_sessions if n not in names]:
+        del active_sessions[name]
+    for target, mirror in list(_screen_mirrors.items()):
+        if mirror.session not in names and not mirror._subscribers:
+            del _screen_mirrors[target]
+
+
+@app.get("/sessions")
+async def sessions():
+    """List tmux sessions with the device currently claiming each."""
+    return {
+        "default": TMUX_SESSION,
+        "sessions": [
+            {**s, "claimed_by": claim_state(s["name"])["device"]}
+            for s in await list_tmux_sessions()
+        ],
+    }
+
+
 class TextInput(BaseModel):
     text: str
 
@@ -63,9 +907,61 @@ class KeyInput(BaseModel):
     key: str
 
 
+# ── index page ──────────────────────────────────────────────────────────
+# The page only depends on the Tailscale IP, so it is rendered and
+# compressed once, and re-rendered when a watcher sees the IP change.
+
+class RenderedPage:
+    def __init__(self, html: str):
+        self.body = html.encode("utf-8")
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:16]
+        self.encoded = {"gzip": compress(self.body, "gzip", level=9)}
+        if brotli is not None:
+            self.encoded["br"] = compress(self.body, "br", level=8)
+
+
+index_page: Optional[RenderedPage] = None
+index_ip = ""
+
+
+@background_task
+async def watch_tailscale_ip():
+    """Render the index page, then re-render whenever the Tailscale IP changes."""
+    global index_page, index_ip
+    while True:
+        try:
+            ip = await fetch_tailscale_ip()
+        except CommandTimeout:
+            ip = index_ip
+        if index_page is None or ip != index_ip:
+            index_ip = ip
+            index_page = RenderedPage(render_index(ip or "127.0.0.1"))
+        await asyncio.sleep(TAILSCALE_WATCH_INTERVAL)
+
+
 @app.get("/", response_class=HTMLResponse)
-async def index():
-    ip = get_tailscale_ip()
+async def index(request: Request):
+    global index_page
+    if index_page is None:
+        index_page = RenderedPage(render_index(await fetch_tailscale_ip() or "127.0.0.1"))
+    # Revalidate every load (the IP may change); unchanged pages cost a 304
+    return page_response(request, index_page)
+
+
+def page_response(request: Request, page: RenderedPage) -> Response:
+    """Serve a pre-rendered page: 304 on a matching ETag, else pre-compressed."""
+    headers = {"ETag": page.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request, page.etag):
+        return Response(status_code=304, headers=headers)
+    accepted = accepted_encodings(request)
+    for encoding in ("br", "gzip"):
+        if encoding in accepted and encoding in page.encoded:
+            headers["Content-Encoding"] = encoding
+            return Response(page.encoded[encoding], media_type="text/html", headers=headers)
+    return Response(page.body, media_type="text/html", headers=headers)
+
+
+def render_index(ip: str) -> str:
     return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -92,6 +988,20 @@ async def index():
             border: none;
             width: 100%;
         }}
+        .wake-snapshot {{
+            display: none;
+            position: fixed;
+            z-index: 50;
+            margin: 0;
+            padding: 2px 4px;
+            overflow: hidden;
+            background: #000;
+            color: #ddd;
+            font-family: 'Menlo', monospace;
+            line-height: 1.2;
+            white-space: pre;
+            pointer-events: none;
+        }}
         .quick-keys {{
             display: flex;
             flex-wrap: wrap;
@@ -221,7 +1131,7 @@ async def index():
 </head>
 <body>
     <div class="container">
-        <iframe class="terminal-frame" src="http://{ip}:{TTYD_PORT}"></iframe>
+        <iframe class="terminal-frame"></iframe>
         <div class="quick-keys">
             <button onclick="sendKey('Up')">&#9650;</button>
             <button onclick="sendKey('Down')">&#9660;</button>
@@ -237,6 +1147,7 @@ async def index():
             <button onclick="copyPane()">Copy</button>
             <button onclick="scrollView()">Scroll</button>
             <button onclick="location.reload()">Refresh</button>
+            <button onclick="location.href = '/lite' + location.search">Lite</button>
             <button id="photoBtn" onclick="document.getElementById('photoInput').click()">&#128247;</button>
             <input type="file" id="photoInput" accept="image/*" multiple style="display:none"
                    onchange="uploadPhoto(this)">
@@ -256,9 +1167,12 @@ async def index():
         <div class="scroll-nav" id="scrollNav" style="display:none">
             <button onclick="scrollToTop()">&#9650; Top</button>
             <button onclick="scrollToBottom()">Bottom &#9660;</button>
+            <button onclick="findInScrollback()">Find</button>
+            <button id="findOlder" onclick="findInScrollback(true)" style="display:none">Older</button>
         </div>
         <button class="close-btn" onclick="closeCopy()">Close</button>
     </div>
+    <pre id="wakeSnapshot" class="wake-snapshot"></pre>
     <div id="kickedOverlay" style="display:none; position:fixed; inset:0; background:rgba(0,0,0,0.92); z-index:200; flex-direction:column; align-items:center; justify-content:center; font-family:-apple-system,system-ui,sans-serif; color:#fff;">
         <div style="font-size:48px; margin-bottom:16px;">&#128274;</div>
         <div style="font-size:20px; font-weight:600; margin-bottom:8px;">Session Taken Over</div>
@@ -274,13 +1188,24 @@ async def index():
         const input = document.getElementById('cmd');
         const UPLOAD_DIR = '/tmp/claude-uploads/';
 
+        // ?session=name picks the tmux session; every API call carries it
+        // and ttyd gets it as the tmux-attach.sh argument (--url-arg)
+        const SESSION = new URLSearchParams(location.search).get('session') || '';
+        const TERMINAL_URL = 'http://{ip}:{TTYD_PORT}/' +
+            (SESSION ? '?arg=' + encodeURIComponent(SESSION) : '');
+        function api(path) {{
+            if (!SESSION) return path;
+            return path + (path.includes('?') ? '&' : '?') + 'session=' + encodeURIComponent(SESSION);
+        }}
+        document.querySelector('.terminal-frame').src = TERMINAL_URL;
+
         // ── session claim (last device wins) ──────────────────────────
         let mySessionId = null;
-        let sessionCheckInterval = null;
+        let sessionEvents = null;
 
         async function claimSession() {{
             try {{
-                const resp = await fetch('/session/claim', {{
+                const resp = await fetch(api('/session/claim'), {{
                     method: 'POST',
                     headers: {{ 'Content-Type': 'application/json' }},
                     body: JSON.stringify({{ device: 'browser-' + navigator.userAgent.slice(0, 30) }})
@@ -294,26 +1219,13 @@ async def index():
             }}
         }}
 
-        async function checkSession() {{
-            if (!mySessionId) return;
-            try {{
-                const resp = await fetch('/session/check/' + mySessionId);
-                const data = await resp.json();
-                if (!data.active) {{
-                    showKicked(data.current_device);
-                }}
-            }} catch (e) {{
-                // Network error — don't kick, just skip this check
-            }}
-        }}
-
         function showKicked(device) {{
-            // Stop polling
-            if (sessionCheckInterval) {{ clearInterval(sessionCheckInterval); sessionCheckInterval = null; }}
+            // Stop listening for claims
+            if (sessionEvents) {{ sessionEvents.close(); sessionEvents = null; }}
             mySessionId = null;
-            // Remove ttyd iframe entirely (kills WebSocket without triggering navigation prompt)
-            const frame = document.querySelector('.terminal-frame');
-            if (frame) frame.remove();
+            // Remove ttyd iframes entirely (kills WebSocket without triggering navigation prompt)
+            document.querySelectorAll('.terminal-frame').forEach(frame => frame.remove());
+            hideSnapshot();
             // Show overlay
             const overlay = document.getElementById('kickedOverlay');
             document.getElementById('kickedDevice').textContent = device ? 'Connected from: ' + device : '';
@@ -326,22 +1238,28 @@ async def index():
                 const container = document.querySelector('.container');
                 const newFrame = document.createElement('iframe');
                 newFrame.className = 'terminal-frame';
-                newFrame.src = 'http://{ip}:{TTYD_PORT}';
+                newFrame.src = TERMINAL_URL;
                 container.insertBefore(newFrame, container.firstChild);
                 // Hide kicked overlay
                 document.getElementById('kickedOverlay').style.display = 'none';
-                // Restart polling
-                startSessionPolling();
+                // Listen for claims again
+                startSessionEvents();
             }});
         }}
 
-        function startSessionPolling() {{
-            if (sessionCheckInterval) clearInterval(sessionCheckInterval);
-            sessionCheckInterval = setInterval(checkSession, 3000);
+        function startSessionEvents() {{
+            if (sessionEvents) sessionEvents.close();
+            if (!mySessionId) return;
+            // Server pushes `kicked` as soon as another device claims;
+            // EventSource reconnects by itself after network blips
+            sessionEvents = new EventSource(api('/session/events/' + mySessionId));
+            sessionEvents.addEventListener('kicked', (e) => {{
+                showKicked(JSON.parse(e.data).current_device);
+            }});
         }}
 
         // Claim on page load
-        claimSession().then(() => startSessionPolling());
+        claimSession().then(() => startSessionEvents());
 
         // Auto-resize textarea as content grows
         input.addEventListener('input', () => {{
@@ -357,6 +1275,80 @@ async def index():
             }}
         }});
 
+        // ── input channel: one WebSocket, ordered batches ─────────────
+        // Items queued while a batch is unacknowledged go out together in
+        // the next batch, so a burst of taps costs one round-trip. A batch
+        // still unacknowledged when the socket drops is sent again, first
+        // and with the same seq, once it reconnects; the server skips it if
+        // it was already applied.
+        const inputClient = Math.random().toString(36).slice(2) + Date.now().toString(36);
+        let inputSocket = null;
+        let inputSeq = 0;
+        let inputInFlight = null;
+        let inputOutbox = [];
+
+        function connectInput() {{
+            const scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+            const ws = new WebSocket(scheme + location.host + api('/input'));
+            ws.onopen = () => {{
+                inputSocket = ws;
+                if (inputInFlight) ws.send(JSON.stringify(inputInFlight));
+                else flushInput();
+            }};
+            ws.onmessage = (e) => {{
+                const ack = JSON.parse(e.data);
+                if (ack.status !== 'sent') console.warn('Input rejected:', ack.error);
+                if (inputInFlight && ack.ack === inputInFlight.seq) {{
+                    inputInFlight = null;
+                    flushInput();
+                }}
+            }};
+            ws.onclose = () => {{
+                const wasOpen = inputSocket === ws;
+                if (wasOpen) inputSocket = null;
+                // A socket that never opened won't get through: use plain HTTP,
+                // unless a batch that may already be applied waits to be resent
+                if (!wasOpen && !inputInFlight) sendOverHttp(inputOutbox.splice(0));
+                setTimeout(connectInput, 1000);
+            }};
+        }}
+
+        function flushInput() {{
+            if (!inputSocket || inputInFlight || !inputOutbox.length) return;
+            inputInFlight = {{ client: inputClient, seq: ++inputSeq, items: inputOutbox.splice(0) }};
+            inputSocket.send(JSON.stringify(inputInFlight));
+        }}
+
+        async function sendOverHttp(items) {{
+            for (const item of items) {{
+                if ('text' in item) {{
+                    await fetch(api('/send'), {{
+                        method: 'POST',
+                        headers: {{ 'Content-Type': 'application/json' }},
+                        body: JSON.stringify({{ text: item.text }})
+                    }});
+                }} else if (!item.enterAfterText) {{
+                    await fetch(api('/key'), {{
+                        method: 'POST',
+                        headers: {{ 'Content-Type': 'application/json' }},
+                        body: JSON.stringify({{ key: item.key }})
+                    }});
+                }}
+            }}
+        }}
+
+        function sendInput(items) {{
+            // While a dropped socket's items wait to be resent, queue behind them
+            if ((inputSocket && inputSocket.readyState === WebSocket.OPEN) || inputInFlight || inputOutbox.length) {{
+                inputOutbox.push(...items);
+                flushInput();
+                return Promise.resolve();
+            }}
+            return sendOverHttp(items);
+        }}
+
+        connectInput();
+
         async function sendText(override) {{
             let text = override || input.value.trim();
             if (!text) return;
@@ -369,11 +1361,8 @@ async def index():
             }});
 
             try {{
-                await fetch('/send', {{
-                    method: 'POST',
-                    headers: {{ 'Content-Type': 'application/json' }},
-                    body: JSON.stringify({{ text }})
-                }});
+                // /send presses Enter itself, so the HTTP fallback skips it
+                await sendInput([{{ text }}, {{ key: 'Enter', enterAfterText: true }}]);
                 if (!override) {{
                     input.value = '';
                     input.style.height = 'auto';
@@ -386,60 +1375,148 @@ async def index():
 
         async function sendKey(key) {{
             try {{
-                await fetch('/key', {{
-                    method: 'POST',
-                    headers: {{ 'Content-Type': 'application/json' }},
-                    body: JSON.stringify({{ key }})
-                }});
+                await sendInput([{{ key }}]);
             }} catch (err) {{
                 console.error('Key send failed:', err);
             }}
         }}
 
-        let scrollInterval = null;
+        // Both overlays show the newest PAGE_LINES lines and page older
+        // ones in from /copy/range as the user scrolls towards the top
+        const PAGE_LINES = 500;
+        let scrollStream = null;
+        let scrollLines = [];
+        let scrollFrom = 0;   // absolute line number of scrollLines[0]
+        let scrollBase = 0;   // oldest line tmux still holds
+        let loadingOlder = false;
+
+        function showScrollLines(stickToBottom) {{
+            const ta = document.getElementById('copyText');
+            const atBottom = (ta.scrollHeight - ta.scrollTop - ta.clientHeight) < 40;
+            ta.value = scrollLines.join('\\n');
+            if (stickToBottom || atBottom) ta.scrollTop = ta.scrollHeight;
+        }}
 
         async function copyPane() {{
             try {{
-                const resp = await fetch('/copy');
+                if (scrollStream) {{ scrollStream.close(); scrollStream = null; }}
+                const resp = await fetch(api('/copy/range?last=' + PAGE_LINES));
                 const data = await resp.json();
                 const overlay = document.getElementById('copyOverlay');
-                const textarea = document.getElementById('copyText');
                 document.getElementById('copyHint').textContent = 'Long-press to select, then Copy';
                 document.getElementById('scrollNav').style.display = 'none';
-                textarea.value = data.text;
+                scrollLines = data.lines;
+                scrollFrom = data.from;
+                scrollBase = data.base;
                 overlay.classList.add('active');
-                textarea.scrollTop = textarea.scrollHeight;
+                showScrollLines(true);
             }} catch (err) {{
                 console.error('Copy failed:', err);
             }}
         }}
 
-        async function scrollView() {{
+        async function loadOlder() {{
+            if (loadingOlder || scrollFrom <= scrollBase) return;
+            loadingOlder = true;
+            const end = scrollFrom;
             try {{
-                const resp = await fetch('/copy');
+                const start = Math.max(scrollBase, end - PAGE_LINES);
+                const resp = await fetch(api('/copy/range?start=' + start + '&end=' + end));
                 const data = await resp.json();
-                const overlay = document.getElementById('copyOverlay');
-                const textarea = document.getElementById('copyText');
-                document.getElementById('copyHint').textContent = 'Live terminal scrollback (auto-refreshes)';
-                document.getElementById('scrollNav').style.display = 'flex';
-                textarea.value = data.text;
-                overlay.classList.add('active');
-                textarea.scrollTop = textarea.scrollHeight;
+                scrollBase = data.base;
+                // Skip the page if the view was reset or history was trimmed meanwhile
+                if (end !== scrollFrom || data.to !== end) return;
+                const ta = document.getElementById('copyText');
+                const height = ta.scrollHeight;
+                scrollLines = data.lines.concat(scrollLines);
+                scrollFrom = data.from;
+                ta.value = scrollLines.join('\\n');
+                ta.scrollTop += ta.scrollHeight - height;
+            }} catch (err) {{
+                console.error('Loading older lines failed:', err);
+            }} finally {{
+                loadingOlder = false;
+            }}
+        }}
 
-                // Auto-refresh every 3 seconds
-                if (scrollInterval) clearInterval(scrollInterval);
-                scrollInterval = setInterval(async () => {{
-                    try {{
-                        const r = await fetch('/copy');
-                        const d = await r.json();
-                        const ta = document.getElementById('copyText');
-                        const atBottom = (ta.scrollHeight - ta.scrollTop - ta.clientHeight) < 40;
-                        ta.value = d.text;
-                        if (atBottom) ta.scrollTop = ta.scrollHeight;
-                    }} catch (e) {{}}
-                }}, 3000);
+        document.getElementById('copyText').addEventListener('scroll', (e) => {{
+            if (e.target.scrollTop < 200) loadOlder();
+        }});
+
+        function applyScrollEvent(kind, data) {{
+            if (kind === 'reset' || data.from < scrollFrom) {{
+                scrollLines = data.lines;
+                scrollFrom = data.from;
+            }} else {{
+                // Drop lines that scrolled out of tmux history, then replace
+                // everything from the first changed line onwards
+                if (data.base > scrollFrom) {{
+                    scrollLines = scrollLines.slice(data.base - scrollFrom);
+                    scrollFrom = data.base;
+                }}
+                scrollLines.length = Math.max(data.from - scrollFrom, 0);
+                scrollLines.push(...data.lines);
+            }}
+            scrollBase = data.base;
+            showScrollLines(kind === 'reset');
+        }}
+
+        function scrollView() {{
+            const overlay = document.getElementById('copyOverlay');
+            document.getElementById('copyHint').textContent = 'Live terminal scrollback (auto-refreshes)';
+            document.getElementById('scrollNav').style.display = 'flex';
+            document.getElementById('findOlder').style.display = 'none';
+            document.getElementById('copyText').value = '';
+            scrollLines = [];
+            scrollFrom = scrollBase = 0;
+            overlay.classList.add('active');
+
+            // Server pushes the newest lines once, then only changed lines;
+            // EventSource reconnects on its own and gets a fresh reset
+            if (scrollStream) scrollStream.close();
+            scrollStream = new EventSource(api('/copy/stream?tail=' + PAGE_LINES));
+            scrollStream.addEventListener('reset', (e) => applyScrollEvent('reset', JSON.parse(e.data)));
+            scrollStream.addEventListener('update', (e) => applyScrollEvent('update', JSON.parse(e.data)));
+        }}
+
+        let findQuery = '';
+        let findBefore = null;
+
+        async function findInScrollback(older) {{
+            if (!older) {{
+                const q = prompt('Find in scrollback (/pattern/ for a regex)', findQuery);
+                if (!q) return;
+                findQuery = q;
+                findBefore = null;
+            }}
+            // Results replace the live view until Scroll is tapped again
+            if (scrollStream) {{ scrollStream.close(); scrollStream = null; }}
+            scrollLines = [];
+            scrollFrom = scrollBase = 0;
+            const isRegex = findQuery.length > 2 && findQuery.startsWith('/') && findQuery.endsWith('/');
+            const params = new URLSearchParams({{ q: isRegex ? findQuery.slice(1, -1) : findQuery, context: '2' }});
+            if (isRegex) params.set('regex', '1');
+            if (findBefore !== null) params.set('before', findBefore);
+            try {{
+                const resp = await fetch(api('/search?' + params));
+                const data = await resp.json();
+                if (!resp.ok) {{
+                    document.getElementById('copyHint').textContent = data.detail || 'Search failed';
+                    return;
+                }}
+                const blocks = data.matches.map(m => [
+                    '── line ' + m.line + ' ──', ...m.before, '» ' + m.text, ...m.after,
+                ].join('\\n'));
+                const ta = document.getElementById('copyText');
+                ta.value = blocks.length ? blocks.join('\\n\\n') : 'No matches';
+                ta.scrollTop = 0;
+                document.getElementById('copyHint').textContent =
+                    data.matches.length + ' match' + (data.matches.length === 1 ? '' : 'es') +
+                    ' for ' + findQuery + (findBefore !== null ? ' (older)' : '') + ', newest first';
+                findBefore = data.next_before;
+                document.getElementById('findOlder').style.display = findBefore === null ? 'none' : '';
             }} catch (err) {{
-                console.error('Scroll view failed:', err);
+                console.error('Search failed:', err);
             }}
         }}
 
@@ -465,7 +1542,7 @@ async def index():
         }}
 
         function closeCopy() {{
-            if (scrollInterval) {{ clearInterval(scrollInterval); scrollInterval = null; }}
+            if (scrollStream) {{ scrollStream.close(); scrollStream = null; }}
             document.getElementById('copyOverlay').classList.remove('active');
             input.focus();
         }}
@@ -498,31 +1575,104 @@ async def index():
             }});
         }}
 
-        async function uploadPhoto(fileInput) {{
-            const files = Array.from(fileInput.files);
-            if (!files.length) return;
-            const btn = document.getElementById('photoBtn');
-            const origText = btn.textContent;
-            const origPlaceholder = input.placeholder;
+        // Files above this size go up in resumable chunks, so a dropped
+        // connection (Wi-Fi to cellular, screen lock) costs a chunk, not the file
+        const RESUMABLE_MIN = 1024 * 1024;
+        const CHUNK_PARALLEL = 3;
 
-            // Show counter on button + status in textarea placeholder
-            const total = files.length;
-            let done = 0;
-            btn.textContent = '0/' + total;
-            btn.disabled = true;
-            input.placeholder = 'Compressing ' + total + ' photo' + (total > 1 ? 's' : '') + '...';
+        async function chunkDigest(blob) {{
+            // crypto.subtle only exists on secure origins; without it the server skips the check
+            if (!window.crypto || !crypto.subtle) return null;
+            const hash = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+            return Array.from(new Uint8Array(hash), b => b.toString(16).padStart(2, '0')).join('');
+        }}
 
-            try {{
-                // Compress all photos first (resize to 1568px, 85% JPEG quality)
+        function missingChunks(state) {{
+            const missing = [];
+            let pos = 0;
+            for (const [start, end] of state.received.concat([[state.size, state.size]])) {{
+                for (let o = pos; o < start; o += state.chunk_size) {{
+                    missing.push([o, Math.min(o + state.chunk_size, start)]);
+                }}
+                pos = end;
+            }}
+            return missing;
+        }}
+
+        async function uploadState(url, options) {{
+            const resp = await fetch(url, options);
+            const data = await resp.json();
+            if (!resp.ok) throw Object.assign(new Error(data.detail), {{ fatal: true }});
+            return data;
+        }}
+
+        async function uploadResumable(file) {{
+            let state = await uploadState('/upload/session', {{
+                method: 'POST',
+                headers: {{ 'Content-Type': 'application/json' }},
+                body: JSON.stringify({{ name: file.name, size: file.size }}),
+            }});
+            const url = '/upload/session/' + state.id;
+            for (let attempt = 0; ; attempt++) {{
+                const missing = missingChunks(state);
+                if (!missing.length) break;
+                if (attempt >= 10) throw new Error('upload stalled');
+                const putChunks = async () => {{
+                    while (missing.length) {{
+                        const [start, end] = missing.shift();
+                        const chunk = file.slice(start, end);
+                        const sum = await chunkDigest(chunk);
+                        await fetch(url + '?offset=' + start + (sum ? '&sha256=' + sum : ''),
+                                    {{ method: 'PUT', body: chunk }});
+                    }}
+                }};
+                try {{
+                    await Promise.all(Array.from({{ length: CHUNK_PARALLEL }}, putChunks));
+                    state = await uploadState(url);
+                }} catch (err) {{
+                    if (err.fatal) throw err;
+                    // Offline for now: back off, then resend whatever didn't arrive
+                    await new Promise(r => setTimeout(r, 1000 * Math.min(attempt + 1, 5)));
+                    try {{
+                        state = await uploadState(url);
+                    }} catch (e) {{
+                        if (e.fatal) throw e;
+                    }}
+                }}
+            }}
+            return uploadState(url + '/finish', {{ method: 'POST' }});
+        }}
+
+        async function uploadPhoto(fileInput) {{
+            const files = Array.from(fileInput.files);
+            if (!files.length) return;
+            const btn = document.getElementById('photoBtn');
+            const origText = btn.textContent;
+            const origPlaceholder = input.placeholder;
+
+            // Show counter on button + status in textarea placeholder
+            const total = files.length;
+            let done = 0;
+            btn.textContent = '0/' + total;
+            btn.disabled = true;
+            input.placeholder = 'Compressing ' + total + ' photo' + (total > 1 ? 's' : '') + '...';
+
+            try {{
+                // Compress all photos first (resize to 1568px, 85% JPEG quality)
                 const compressed = await Promise.all(files.map(f => compressImage(f, 1568, 0.85)));
                 input.placeholder = 'Uploading ' + total + ' photo' + (total > 1 ? 's' : '') + '...';
 
                 // Upload all photos in parallel, updating counter as each finishes
                 const uploads = compressed.map(file => {{
-                    const form = new FormData();
-                    form.append('file', file);
-                    return fetch('/upload', {{ method: 'POST', body: form }})
-                        .then(r => r.json())
+                    let upload;
+                    if (file.size > RESUMABLE_MIN) {{
+                        upload = uploadResumable(file).catch(err => ({{ error: err.message }}));
+                    }} else {{
+                        const form = new FormData();
+                        form.append('file', file);
+                        upload = fetch('/upload', {{ method: 'POST', body: form }}).then(r => r.json());
+                    }}
+                    return upload
                         .then(data => {{
                             done++;
                             btn.textContent = done + '/' + total;
@@ -553,16 +1703,80 @@ async def index():
             }}
         }}
 
+        // ── instant wake ──────────────────────────────────────────────
+        // The server keeps a copy of the screen; on wake it is drawn over
+        // the stale terminal at once while a fresh ttyd iframe connects
+        // invisibly behind it, and the two swap once ttyd has loaded.
+        const snapshot = document.getElementById('wakeSnapshot');
+        let pendingFrame = null;
+
+        function coverTerminal(el, frame) {{
+            const rect = frame.getBoundingClientRect();
+            Object.assign(el.style, {{
+                top: rect.top + 'px', left: rect.left + 'px',
+                width: rect.width + 'px', height: rect.height + 'px',
+            }});
+            return rect;
+        }}
+
+        async function showSnapshot(frame) {{
+            try {{
+                // no-cache revalidates with the ETag: an unchanged screen is a 304
+                const resp = await fetch(api('/screen'), {{ cache: 'no-cache' }});
+                if (!resp.ok) return;
+                const data = await resp.json();
+                if (!pendingFrame) return;  // the live terminal won the race
+                const rect = coverTerminal(snapshot, frame);
+                const size = Math.min(14, Math.max(6, (rect.width - 8) / (data.width * 0.6)));
+                snapshot.style.fontSize = size.toFixed(1) + 'px';
+                const rows = [];
+                for (let i = 0; i < data.height; i++) rows.push(data.rows[i] || '');
+                snapshot.textContent = rows.join('\\n');
+                snapshot.style.display = 'block';
+            }} catch (err) {{
+                console.warn('Screen snapshot failed:', err);
+            }}
+        }}
+
+        function hideSnapshot() {{
+            snapshot.style.display = 'none';
+            if (pendingFrame) pendingFrame.remove();
+            pendingFrame = null;
+        }}
+
+        function reloadTerminal() {{
+            const old = document.querySelector('.terminal-frame:not(.loading)');
+            if (!old) return;
+            if (pendingFrame) pendingFrame.remove();
+            const next = document.createElement('iframe');
+            next.className = 'terminal-frame loading';
+            // Laid out at full size (so ttyd doesn't resize tmux) but invisible
+            coverTerminal(next, old);
+            Object.assign(next.style, {{ position: 'fixed', opacity: '0', pointerEvents: 'none' }});
+            const swap = () => {{
+                if (pendingFrame !== next) return;
+                pendingFrame = null;
+                old.remove();
+                next.className = 'terminal-frame';
+                next.removeAttribute('style');
+                snapshot.style.display = 'none';
+            }};
+            // Give ttyd a moment after load to open its WebSocket and paint
+            next.addEventListener('load', () => setTimeout(swap, 400));
+            setTimeout(swap, 8000);
+            next.src = TERMINAL_URL;
+            old.after(next);
+            pendingFrame = next;
+            showSnapshot(old);
+        }}
+
         // Auto-reconnect: re-claim session and reload iframe when tab becomes visible
-        const terminal = document.querySelector('.terminal-frame');
         document.addEventListener('visibilitychange', () => {{
             if (document.visibilityState === 'visible') {{
                 const overlay = document.getElementById('kickedOverlay');
                 if (overlay.style.display === 'flex') return;  // kicked — don't auto-reconnect
-                claimSession().then(() => {{
-                    terminal.src = terminal.src;
-                    startSessionPolling();
-                }});
+                reloadTerminal();
+                claimSession().then(startSessionEvents);
             }}
         }});
 
@@ -572,41 +1786,73 @@ async def index():
 </html>"""
 
 
-## ── session claim (last device wins) ───────────────────────────────────
+# ── session claim (last device wins) ────────────────────────────────────
+
+session_events = Broadcaster()
 
 @app.post("/session/claim")
-async def claim_session(request: Request):
+async def claim_session(request: Request, session: str = Depends(session_param)):
     """Claim the active session. Kicks any previous device."""
     body = await request.json()
     session_id = str(uuid.uuid4())
-    active_session["id"] = session_id
-    active_session["device"] = body.get("device", "unknown")
-    active_session["claimed_at"] = time.time()
+    state = claim_state(session)
+    session_claims.inc(session=session)
+    if state["id"] is not None:
+        session_takeovers.inc(session=session)
+    state["id"] = session_id
+    state["device"] = body.get("device", "unknown")
+    state["claimed_at"] = time.time()
+    session_events.publish({"session": session, "session_id": session_id, "device": state["device"]})
     return {"session_id": session_id}
 
 
 @app.get("/session/check/{session_id}")
-async def check_session(session_id: str):
+async def check_session(session_id: str, session: str = Depends(session_param)):
     """Check if the given session is still the active one."""
-    if active_session["id"] is None:
+    state = claim_state(session)
+    if state["id"] is None:
         # Server just restarted — don't kick anyone
         return {"active": True, "current_device": None}
     return {
-        "active": active_session["id"] == session_id,
-        "current_device": active_session["device"],
+        "active": state["id"] == session_id,
+        "current_device": state["device"],
     }
 
 
+@app.get("/session/events/{session_id}")
+async def session_events_stream(session_id: str, session: str = Depends(session_param)):
+    """Server-sent events: a `kicked` event the moment another device claims."""
+    async def events():
+        with session_events.subscribe() as claims:
+            state = claim_state(session)
+            if state["id"] not in (None, session_id):
+                yield sse_event("kicked", {"current_device": state["device"]})
+                return
+            yield ": connected\n\n"
+            while True:
+                claim = await claims.get()
+                # A subscriber that falls behind loses events, so check the
+                # current claim on every wake rather than trusting the queue
+                state = claim_state(session)
+                if state["id"] not in (None, session_id):
+                    yield sse_event("kicked", {"current_device": state["device"]})
+                    return
+                if claim is None:
+                    yield ": keepalive\n\n"
+                elif claim["session"] == session and claim["session_id"] != session_id:
+                    yield sse_event("kicked", {"current_device": claim["device"]})
+                    return
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @app.post("/send")
-async def send_text(payload: TextInput):
+async def send_text(payload: TextInput, session: str = Depends(session_param)):
     """Send literal text to tmux, then press Enter."""
-    subprocess.run(
-        [TMUX, "send-keys", "-t", TMUX_SESSION, "-l", payload.text],
-        timeout=5,
-    )
-    subprocess.run(
-        [TMUX, "send-keys", "-t", TMUX_SESSION, "Enter"],
-        timeout=5,
+    await tmux_sequence(
+        ("send-keys", "-t", session, "-l", payload.text),
+        ("send-keys", "-t", session, "Enter"),
+        session=session,
     )
     return {"status": "sent"}
 
@@ -619,133 +1865,2826 @@ ALLOWED_KEYS = {
 
 
 @app.post("/key")
-async def send_key(payload: KeyInput):
+async def send_key(payload: KeyInput, session: str = Depends(session_param)):
     """Send a special key (Escape, C-c, Enter, etc.) to tmux."""
     if payload.key not in ALLOWED_KEYS:
         return {"status": "rejected", "error": "key not allowed"}
-    subprocess.run(
-        [TMUX, "send-keys", "-t", TMUX_SESSION, payload.key],
-        timeout=5,
-    )
+    await tmux("send-keys", "-t", session, payload.key, session=session)
     return {"status": "sent"}
 
 
+# ── key sequences ───────────────────────────────────────────────────────
+# Literal text and named keys, applied as a single tmux command list:
+#   [{"key": "Up"}, {"key": "Up"}, {"text": "ls"}, {"key": "Enter"}]
+# Consecutive keys (or texts) are merged into one send-keys.
+
+class InputRun(NamedTuple):
+    kind: str  # "text" or "keys"
+    values: list[str]
+    segments: list[int]  # indexes of the input items merged into this run
+
+
+def merge_input_items(items: list) -> list[InputRun]:
+    """Group input items into runs of text and of keys.
+
+    Raises ValueError for malformed items or keys not in ALLOWED_KEYS.
+    """
+    runs: list[InputRun] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"segment {index}: malformed item")
+        if "text" in item:
+            kind, value = "text", str(item["text"])
+        elif item.get("key") in ALLOWED_KEYS:
+            kind, value = "keys", item["key"]
+        else:
+            raise ValueError(f"segment {index}: key not allowed: {item.get('key')}")
+        if runs and runs[-1].kind == kind:
+            runs[-1].values.append(value)
+            runs[-1].segments.append(index)
+        else:
+            runs.append(InputRun(kind, [value], [index]))
+    return [run for run in runs if run.kind == "keys" or "".join(run.values)]
+
+
+def input_commands(target: str, runs: list[InputRun]) -> list[tuple[str, ...]]:
+    commands = []
+    for run in runs:
+        if run.kind == "text":
+            commands.append(("send-keys", "-t", target, "-l", "".join(run.values)))
+        else:
+            commands.append(("send-keys", "-t", target, *run.values))
+    return commands
+
+
+async def send_input(session: str, target: str, items: list) -> list[dict]:
+    """Apply input items atomically; returns a status per item.
+
+    Raises ValueError (nothing is sent) if any item is invalid.
+    """
+    runs = merge_input_items(items)
+    statuses = [{"index": i, "status": "sent"} for i in range(len(items))]
+    if not runs:
+        return statuses
+    results = await tmux_sequence(*input_commands(target, runs), session=session)
+    for i, run in enumerate(runs):
+        if i >= len(results):
+            status = {"status": "skipped"}
+        elif results[i].returncode != 0:
+            status = {"status": "failed", "error": results[i].stderr.strip()}
+        else:
+            continue
+        for index in run.segments:
+            statuses[index].update(status)
+    return statuses
+
+
+class SequenceInput(BaseModel):
+    segments: list[dict]
+    window: str = ""
+
+
+@app.post("/send/sequence")
+async def send_sequence(payload: SequenceInput, session: str = Depends(session_param)):
+    """Send literal text and named keys as one atomic tmux operation."""
+    target = f"{session}:{payload.window}" if payload.window else session
+    try:
+        segments = await send_input(session, target, payload.segments)
+    except ValueError as e:
+        return {"status": "rejected", "error": str(e)}
+    ok = all(seg["status"] == "sent" for seg in segments)
+    return {"status": "sent" if ok else "failed", "segments": segments}
+
+
+# ── input channel ───────────────────────────────────────────────────────
+# One WebSocket per browser carries ordered batches of key sequences,
+#   {"client": "k3x9...", "seq": 7, "items": [...]}
+# each applied with send_input and acknowledged with {"ack": seq, ...}.
+# `client` is fixed per page load and `seq` only grows, even across
+# reconnects, so a batch resent after a drop is acknowledged again but
+# not applied twice.
+
+INPUT_CLIENTS = 256  # page loads whose last applied seq is remembered
+input_applied: collections.OrderedDict = collections.OrderedDict()  # client -> seq
+
+
+def input_seen(client, seq) -> bool:
+    """Whether this batch was already applied; records it if not."""
+    if not isinstance(client, str) or not isinstance(seq, int):
+        return False
+    last = input_applied.get(client)
+    if last is not None and seq <= last:
+        return True
+    input_applied[client] = seq
+    input_applied.move_to_end(client)
+    while len(input_applied) > INPUT_CLIENTS:
+        input_applied.popitem(last=False)
+    return False
+
+
+@app.websocket("/input")
+async def input_channel(ws: WebSocket, session: str = Depends(session_param)):
+    """Persistent input socket: ordered, merged, acknowledged keystrokes."""
+    await ws.accept()
+    try:
+        while True:
+            message = None
+            try:
+                message = await ws.receive_json()
+                seq = message.get("seq")
+                if input_seen(message.get("client"), seq):
+                    await ws.send_json({"ack": seq, "status": "sent", "duplicate": True})
+                    continue
+                segments = await send_input(session, session, message.get("items", []))
+            except (ValueError, AttributeError) as e:
+                seq = message.get("seq") if isinstance(message, dict) else None
+                await ws.send_json({"ack": seq, "status": "rejected", "error": str(e)})
+                continue
+            except CommandTimeout as e:
+                await ws.send_json({"ack": seq, "status": "failed", "error": str(e)})
+                continue
+            ok = all(seg["status"] == "sent" for seg in segments)
+            await ws.send_json({"ack": seq, "status": "sent" if ok else "failed"})
+    except WebSocketDisconnect:
+        pass
+
+
+# ── scrollback mirror ───────────────────────────────────────────────────
+# A server-side copy of a pane's scrollback. Lines above the visible screen
+# never change once written, so each refresh only captures from the old top
+# of the screen down. Lines are numbered absolutely: `base` counts lines
+# that have scrolled off the top of tmux's history-limit since startup.
+
+SCROLLBACK_MIN_INTERVAL = float(os.environ.get("SCROLLBACK_MIN_INTERVAL", "0.25"))
+COPY_RANGE_MAX = 5000  # lines per /copy/range response
+
+
+def _split_lines(text: str) -> list[str]:
+    lines = text.split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def _rfind_run(haystack: list[str], needle: list[str]) -> Optional[int]:
+    """Index of the last occurrence of `needle` as a contiguous run."""
+    for i in range(len(haystack) - len(needle), -1, -1):
+        if haystack[i:i + len(needle)] == needle:
+            return i
+    return None
+
+
+class PaneMirror:
+    """Server-side copy of some part of a pane, followed by version number.
+
+    Subclasses implement refresh() and call _bump() when the content
+    changes. While anyone is watching, a pump task refreshes on pane
+    output, at most once every MIN_INTERVAL seconds.
+    """
+
+    MIN_INTERVAL = SCROLLBACK_MIN_INTERVAL
+
+    def __init__(self, target: str, session: str):
+        self.target = target
+        self.session = session
+        self.version = 0
+        self._state = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._version_event: Optional[asyncio.Event] = None
+        self._subscribers = 0
+        self._pump_task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        raise NotImplementedError
+
+    def _bump(self):
+        self.version += 1
+        if self._version_event is not None:
+            self._version_event.set()
+        self._version_event = asyncio.Event()
+
+    async def wait_changed(self, version: int, timeout: float) -> bool:
+        if self.version != version:
+            return True
+        if self._version_event is None:
+            self._version_event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._version_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.version != version
+
+    def _subscribe(self):
+        """Count a watcher in (callers decrement _subscribers when done)."""
+        self._subscribers += 1
+        if self._pump_task is None:
+            self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+
+    async def _pump(self):
+        """Refresh on pane output while anyone is watching."""
+        control = control_client(self.session)
+        wake = asyncio.Event()
+        # Pane targets only wake on their own pane's output
+        prefix = f"%output {self.target} " if self.target.startswith("%") else "%output "
+
+        def on_notification(line: str):
+            if line.startswith(prefix):
+                wake.set()
+
+        control.listeners.append(on_notification)
+        try:
+            while self._subscribers:
+                if TMUX_CONTROL:
+                    try:
+                        await control.ensure_connected()
+                    except ControlConnectionError:
+                        pass
+                # Without control mode there are no output notifications: poll
+                try:
+                    await asyncio.wait_for(wake.wait(), 5 if control.connected else 1)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                try:
+                    await self.refresh()
+                except CommandTimeout:
+                    pass
+                await asyncio.sleep(self.MIN_INTERVAL)
+        finally:
+            control.listeners.remove(on_notification)
+            self._pump_task = None
+
+
+class ScrollbackMirror(PaneMirror):
+    """Incrementally refreshed copy of one pane's history plus screen."""
+
+    ANCHOR = 4
+
+    def __init__(self, target: str, session: str):
+        super().__init__(target, session)
+        self.lines: list[str] = []
+        self.base = 0
+        self.history_size = 0
+        self._changes: collections.deque = collections.deque(maxlen=64)
+        self.reset_version = 0  # clients older than this need a fresh snapshot
+        self.archive: Optional[ScrollbackArchive] = None
+        self.history_limit = 0
+        self.scroll_rate = 0.0  # lines per second entering history
+        self._scroll_at = 0.0
+        self._scroll_end = 0
+
+    async def _capture(self, start: str) -> Optional[list[str]]:
+        result = await tmux("capture-pane", "-p", "-t", self.target, "-S", start,
+                            session=self.session)
+        if result.returncode != 0:
+            return None
+        return _split_lines(result.stdout)
+
+    async def refresh(self) -> bool:
+        """Bring the mirror up to date; returns True if anything changed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            control = control_client(self.session)
+            output_seq = control.output_seq
+            info = await tmux(
+                "display-message", "-p", "-t", self.target,
+                "#{history_size} #{cursor_x} #{cursor_y} #{window_activity} #{start_time}"
+                " #{history_limit}",
+                session=self.session,
+            )
+            try:
+                hsize, cursor_x, cursor_y, activity, started, self.history_limit = (
+                    int(v) for v in info.stdout.split())
+            except ValueError:
+                return False
+            # Skip the capture when nothing can have changed: no %output
+            # since last time, or (without control mode) no activity in the
+            # last second and the cursor hasn't moved.
+            state = (hsize, cursor_x, cursor_y, activity,
+                     output_seq if control.connected else None)
+            if state == self._state and (control.connected or time.time() - activity >= 1):
+                self._track_scroll()
+                return False
+            old, old_h = self.lines, self.history_size
+            drop = 0
+            keep = None  # number of leading lines known to be unchanged
+            if self.version:
+                anchor = old[max(old_h - self.ANCHOR, 0):old_h]
+                if hsize >= old_h:
+                    # Assume nothing scrolled off (tmux trims history in
+                    # chunks once it hits history-limit), and check that the
+                    # last old history lines are still where they were.
+                    captured = await self._capture(str(old_h - hsize - len(anchor)))
+                    if captured is not None and captured[:len(anchor)] == anchor:
+                        new, keep = old[:old_h] + captured[len(anchor):], old_h
+                if keep is None and anchor:
+                    new, drop, keep = await self._realign(old, old_h, hsize, anchor)
+            if keep is None:
+                captured = await self._capture("-")
+                if captured is None:
+                    return False
+                new, drop, keep = captured, len(old), 0
+                if self.version:
+                    # Lost track of the history (e.g. clear-history): number
+                    # the capture after the old lines and resync every client
+                    self.reset_version = self.version + 1
+                elif ARCHIVE_DIR:
+                    # Pane ids are reused after a tmux server restart
+                    self.archive = scrollback_archive(
+                        f"{self.session}-{started}-{self.target.lstrip('%')}")
+                    self.base = self.archive.align(captured[:hsize])
+            first = keep
+            for i in range(keep, min(len(new), len(old) - drop)):
+                if new[i] != old[i + drop]:
+                    break
+                first = i + 1
+            changed = drop > 0 or len(new) != len(old) or first < len(new)
+            self.lines, self.history_size = new, hsize
+            self.base += drop
+            self._state = state
+            self._track_scroll()
+            if self.archive is not None:
+                await self._archive_history()
+            if changed or not self.version:
+                self._bump(self.base + first)
+            return changed
+
+    def _track_scroll(self):
+        """Update scroll_rate: rises at once, halves per idle refresh."""
+        now, end = time.monotonic(), self.base + self.history_size
+        if self._scroll_at:
+            rate = max(end - self._scroll_end, 0) / max(now - self._scroll_at, 0.001)
+            self.scroll_rate = max(rate, (self.scroll_rate + rate) / 2)
+        self._scroll_at, self._scroll_end = now, end
+
+    def archive_interval(self) -> float:
+        """How long until the next refresh, so no line leaves history unseen.
+
+        tmux drops the oldest lines once history_limit is reached; at the
+        current scroll rate a quarter of the limit is the safety margin.
+        """
+        if not self.scroll_rate or not self.history_limit:
+            return ARCHIVE_INTERVAL
+        return min(max(self.history_limit / 4 / self.scroll_rate, ARCHIVE_MIN_INTERVAL),
+                   ARCHIVE_INTERVAL)
+
+    async def _archive_history(self):
+        """Hand lines that have scrolled into history to the archive."""
+        start = max(self.archive.total, self.base)
+        end = self.base + self.history_size
+        if start < end:
+            self.archive.extend(start, self.lines[start - self.base:end - self.base])
+        if self.archive.due():
+            await self.archive.flush()
+
+    async def _realign(self, old, old_h, hsize, anchor):
+        """Find how far history was trimmed by locating old lines again."""
+        depth = len(old) - old_h + 64
+        while True:
+            depth = min(depth, hsize)
+            captured = await self._capture(str(-depth))
+            if captured is None:
+                return None, 0, None
+            pos = _rfind_run(captured, anchor)
+            if pos is not None:
+                start = old_h - len(anchor)
+                drop = start - (hsize - depth + pos)
+                if drop < 0:
+                    return None, 0, None
+                return old[drop:start] + captured[pos:], drop, start - drop
+            if depth >= hsize:
+                return None, 0, None
+            depth *= 4
+
+    def _bump(self, first_changed: int):
+        self._changes.append((self.version + 1, first_changed))
+        super()._bump()
+
+    @property
+    def total(self) -> int:
+        return self.base + len(self.lines)
+
+    @property
+    def oldest(self) -> int:
+        """First line still readable, from the archive if there is one."""
+        if self.archive is None:
+            return self.base
+        return min(self.archive.first, self.base)
+
+    def snapshot(self, tail: Optional[int] = None) -> dict:
+        """Everything mirrored, or only the last `tail` lines."""
+        start = self.base if tail is None else max(self.total - tail, self.base)
+        return {
+            "type": "reset", "base": self.oldest, "from": start, "total": self.total,
+            "lines": self.lines[start - self.base:],
+        }
+
+    def delta_since(self, version: int, tail: Optional[int] = None) -> dict:
+        """Lines a client at `version` needs to catch up.
+
+        A client that only holds the last `tail` lines gets a fresh
+        snapshot instead of a change that starts above them.
+        """
+        newer = [first for v, first in self._changes if v > version]
+        if (not self._changes or self._changes[0][0] > version + 1
+                or version < self.reset_version):
+            return self.snapshot(tail)
+        start = max(min(newer, default=self.base + len(self.lines)), self.base)
+        if tail is not None and start < self.total - tail:
+            return self.snapshot(tail)
+        return {
+            "type": "update", "base": self.oldest, "from": start,
+            "lines": self.lines[start - self.base:],
+        }
+
+    async def watch(self, tail: Optional[int] = None):
+        """Yield a reset, then updates as the pane changes (None = idle)."""
+        self._subscribe()
+        try:
+            await self.refresh()
+            version = self.version
+            yield self.snapshot(tail)
+            while True:
+                if not await self.wait_changed(version, SSE_KEEPALIVE):
+                    yield None
+                    continue
+                delta = self.delta_since(version, tail)
+                version = self.version
+                yield delta
+        finally:
+            self._subscribers -= 1
+
+
+_scrollback_mirrors: dict[str, ScrollbackMirror] = {}
+
+
+def scrollback_mirror(session: str, pane_id: str) -> ScrollbackMirror:
+    """The shared mirror of one pane (mirrors never follow window switches)."""
+    mirror = _scrollback_mirrors.get(pane_id)
+    if mirror is None:
+        mirror = _scrollback_mirrors[pane_id] = ScrollbackMirror(pane_id, session)
+    return mirror
+
+
+async def active_pane_id(session: str) -> str:
+    result = await tmux("display-message", "-p", "-t", session, "#{pane_id}", session=session)
+    pane_id = result.stdout.strip()
+    if result.returncode != 0 or not pane_id.startswith("%"):
+        raise HTTPException(status_code=404, detail="pane not found")
+    return pane_id
+
+
+async def session_mirror(session: str) -> ScrollbackMirror:
+    """The mirror of the session's active pane."""
+    return scrollback_mirror(session, await active_pane_id(session))
+
+
 @app.get("/copy")
-async def copy_pane():
-    """Capture full tmux pane scrollback for copying."""
-    result = subprocess.run(
-        [TMUX, "capture-pane", "-t", TMUX_SESSION, "-p", "-S", "-"],
-        capture_output=True, text=True, timeout=5,
-    )
-    return {"text": result.stdout}
+async def copy_pane(request: Request, since: Optional[int] = None,
+                    session: str = Depends(session_param)):
+    """Capture tmux pane scrollback for copying.
 
+    Served from the scrollback mirror with an ETag, so an unchanged pane
+    answers 304. Pass `since=<screen_top>` from a previous response to get
+    only the lines from that point on (everything above it is immutable).
+    """
+    mirror = await session_mirror(session)
+    await mirror.refresh()
+    start = mirror.base if since is None else min(max(since, mirror.base), mirror.total)
+    etag = f'"{BOOT_ID}-{mirror.version}-{start if since is not None else "all"}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    lines = mirror.lines[start - mirror.base:]
+    payload = {
+        "text": "\n".join(lines) + "\n" if lines else "",
+        "from": start,
+        "base": mirror.base,
+        "screen_top": mirror.base + mirror.history_size,
+        "total": mirror.total,
+    }
+    body = json.dumps(payload).encode()
+    copy_payload.observe(len(body), mode="full" if since is None else "delta")
+    return encoded_response(request, body, "application/json", headers)
 
-## ── tmux window management ─────────────────────────────────────────────
 
-@app.get("/tmux/windows")
-async def list_windows():
-    """List all tmux windows in the session."""
-    result = subprocess.run(
-        [TMUX, "list-windows", "-t", TMUX_SESSION,
-         "-F", "#{window_index}|#{window_name}|#{window_active}|#{pane_current_command}"],
-        capture_output=True, text=True, timeout=5,
-    )
-    windows = []
-    for line in result.stdout.strip().split("\n"):
-        if not line:
+@app.get("/copy/range")
+async def copy_range(request: Request, start: Optional[int] = None, end: Optional[int] = None,
+                     last: Optional[int] = None, session: str = Depends(session_param)):
+    """Scrollback lines [start, end), or only the `last` N lines.
+
+    Line numbers are the absolute ones /copy uses: `base` is the oldest
+    line still available (in tmux, or in the archive when ARCHIVE_DIR is
+    set) and `total` is one past the newest. At most COPY_RANGE_MAX lines
+    come back per call, so huge histories are paged.
+    """
+    mirror = await session_mirror(session)
+    if last is not None:
+        last = min(max(last, 0), COPY_RANGE_MAX)
+        if not mirror.version and not ARCHIVE_DIR:
+            # Nothing mirrored yet: capture only the tail, not the whole history
+            return await copy_tail(request, session, last)
+    await mirror.refresh()
+    total, oldest = mirror.total, mirror.oldest
+    if last is not None:
+        start, end = total - last, total
+    start = min(max(start if start is not None else oldest, oldest), total)
+    end = min(max(end if end is not None else total, start), total, start + COPY_RANGE_MAX)
+    etag = f'"{BOOT_ID}-{mirror.version}-{start}-{end}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    lines, gaps = [], []
+    if start < mirror.base:
+        lines = await asyncio.to_thread(mirror.archive.read, start, min(end, mirror.base))
+        gaps = mirror.archive.gaps(start, min(end, mirror.base))
+    if end > mirror.base:
+        lines += mirror.lines[max(start, mirror.base) - mirror.base:end - mirror.base]
+    payload = {
+        "lines": lines,
+        "from": start,
+        "to": end,
+        "base": oldest,
+        "screen_top": mirror.base + mirror.history_size,
+        "total": total,
+    }
+    if gaps:
+        payload["gaps"] = gaps  # [start, end) ranges lost before archiving
+    body = json.dumps(payload).encode()
+    copy_payload.observe(len(body), mode="range")
+    return encoded_response(request, body, "application/json", headers)
+
+
+async def copy_tail(request: Request, session: str, last: int) -> Response:
+    """/copy/range?last=N straight from `capture-pane -S -N`.
+
+    Numbered as the mirror's first full capture will number them, so
+    pages fetched later line up.
+    """
+    info = await tmux("display-message", "-p", "-t", session, "#{history_size}", session=session)
+    result = await tmux("capture-pane", "-p", "-t", session, "-S", str(-last), session=session)
+    try:
+        hsize = int(info.stdout.strip())
+    except ValueError:
+        raise HTTPException(status_code=404, detail="pane not found")
+    lines = _split_lines(result.stdout)
+    total = hsize + len(lines) - min(last, hsize)
+    lines = lines[max(len(lines) - last, 0):]
+    payload = {
+        "lines": lines,
+        "from": total - len(lines),
+        "to": total,
+        "base": 0,
+        "screen_top": hsize,
+        "total": total,
+    }
+    body = json.dumps(payload).encode()
+    copy_payload.observe(len(body), mode="tail")
+    return encoded_response(request, body, "application/json", {"Cache-Control": "no-cache"})
+
+
+@app.get("/copy/stream")
+async def copy_stream(tail: Optional[int] = None, session: str = Depends(session_param)):
+    """Server-sent events: the scrollback once, then only changed lines.
+
+    With `tail=N` the first event (and any resync) carries only the last
+    N lines; older ones can be paged in from /copy/range. The stream
+    stays on the pane that was active when it opened.
+    """
+    mirror = await session_mirror(session)
+
+    async def events():
+        async for item in mirror.watch(tail):
+            if item is None:
+                yield ": keepalive\n\n"
+            else:
+                yield sse_event(item["type"], item)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ── scrollback archive ──────────────────────────────────────────────────
+# History lines that leave the screen are appended to an on-disk log per
+# pane, so output older than tmux's history-limit survives. The log is a
+# run of zlib blocks (<pane>.log) plus a fixed-size index record per block
+# (<pane>.idx); a range read decompresses only the blocks it touches,
+# straight out of an mmap of the log. Archived lines share the mirror's
+# absolute numbering, so /copy/range pages on into the archive.
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "")
+ARCHIVE_INTERVAL = float(os.environ.get("ARCHIVE_INTERVAL", "10"))
+ARCHIVE_CHECK_INTERVAL = 1.0  # how often panes are checked for new history
+ARCHIVE_MIN_INTERVAL = 0.25  # poll floor for panes scrolling fast
+ARCHIVE_BLOCK_LINES = 2000
+ARCHIVE_FLUSH_AFTER = 60.0  # seconds a partial block may stay in memory
+ARCHIVE_CACHE_BLOCKS = 8
+ARCHIVE_ANCHOR = 8
+ARCHIVE_INDEX = struct.Struct("<QQII")  # first line, log offset, compressed size, lines
+
+
+class ArchiveGap:
+    """Stand-in for lines that scrolled out of tmux before they were archived.
+
+    Reads as a marker line followed by blank lines, so numbering holds.
+    Stored as an index record with no data.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: slice) -> list[str]:
+        start, stop, _ = index.indices(self.count)
+        marker = "[lines lost here: output scrolled past tmux's history-limit before it was archived]"
+        return [marker if i == 0 else "" for i in range(start, stop)]
+
+
+class ScrollbackArchive:
+    """Append-only compressed line log with a block index.
+
+    Appends land in `pending`, are cut into blocks of up to
+    ARCHIVE_BLOCK_LINES and compressed in a worker thread; blocks stay
+    readable from `_queue` until they are on disk. `_lock` guards the block
+    list, the mmap and the in-memory lines, since reads run in threads too.
+    """
+
+    def __init__(self, path: Path):
+        self.log_path = path.with_suffix(".log")
+        self.index_path = path.with_suffix(".idx")
+        self.firsts: list[int] = []
+        self.blocks: list[tuple[int, int, int]] = []  # offset, size, lines
+        self.size = 0
+        self.gap_count = 0
+        self.pending: list[str] = []
+        self.pending_first = 0
+        self.pending_since = 0.0
+        self._queue: collections.deque = collections.deque()  # (first, lines)
+        self._map: Optional[mmap.mmap] = None
+        self._cache: collections.OrderedDict = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._load()
+
+    def _load(self):
+        """Read the index, dropping a torn tail left by a crash mid-append."""
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            raw = self.index_path.read_bytes()
+        except FileNotFoundError:
+            raw = b""
+        log_size = self.log_path.stat().st_size if self.log_path.exists() else 0
+        end = 0
+        for i in range(len(raw) // ARCHIVE_INDEX.size):
+            first, offset, size, count = ARCHIVE_INDEX.unpack_from(raw, i * ARCHIVE_INDEX.size)
+            if offset != end or offset + size > log_size:
+                break
+            self.firsts.append(first)
+            self.blocks.append((offset, size, count))
+            if size == 0:
+                self.gap_count += 1
+            end = offset + size
+        with open(self.index_path, "ab") as f:
+            f.truncate(len(self.blocks) * ARCHIVE_INDEX.size)
+        with open(self.log_path, "ab") as f:
+            f.truncate(end)
+        self.size = end
+        self.pending_first = self.firsts[-1] + self.blocks[-1][2] if self.blocks else 0
+        self._remap()
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self.size:
+            with open(self.log_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def first(self) -> int:
+        if self.firsts:
+            return self.firsts[0]
+        return self._queue[0][0] if self._queue else self.pending_first
+
+    @property
+    def total(self) -> int:
+        """One past the newest archived line."""
+        return self.pending_first + len(self.pending)
+
+    def align(self, history: list[str]) -> int:
+        """Absolute number of history[0], continuing where the archive left off.
+
+        After a wrapper restart tmux usually still holds lines archived last
+        time; finding the archive's last few lines in `history` keeps them
+        from being archived twice.
+        """
+        total = self.total
+        anchor = self.read(max(total - ARCHIVE_ANCHOR, self.first), total)
+        pos = _rfind_run(history, anchor) if anchor else None
+        if pos is None or pos + len(anchor) > total:
+            return total
+        return total - pos - len(anchor)
+
+    def extend(self, first: int, lines: list[str]):
+        """Queue lines numbered from `first`; a jump leaves a gap."""
+        with self._lock:
+            if first != self.total:
+                # Blocks are contiguous: cut the current one here and
+                # record the lines that were never seen as a gap
+                if self.pending:
+                    self._queue.append((self.pending_first, self.pending))
+                self._queue.append((self.total, ArchiveGap(first - self.total)))
+                self.gap_count += 1
+                print(f"scrollback archive {self.log_path.stem}: output scrolled past history-limit before it was archived")
+                self.pending, self.pending_first = [], first
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.extend(lines)
+
+    def due(self) -> bool:
+        return bool(self._queue) or len(self.pending) >= ARCHIVE_BLOCK_LINES or (
+            self.pending and time.monotonic() - self.pending_since >= ARCHIVE_FLUSH_AFTER)
+
+    async def flush(self, force: bool = False):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while self._queue or len(self.pending) >= ARCHIVE_BLOCK_LINES or (force and self.pending):
+                await asyncio.to_thread(self._write_block)
+
+    def _write_block(self):
+        with self._lock:
+            if not self._queue:
+                lines = self.pending[:ARCHIVE_BLOCK_LINES]
+                self._queue.append((self.pending_first, lines))
+                self.pending = self.pending[ARCHIVE_BLOCK_LINES:]
+                self.pending_first += len(lines)
+            first, lines = self._queue[0]
+        if isinstance(lines, ArchiveGap):
+            data = b""
+        else:
+            data = zlib.compress(("\n".join(lines) + "\n").encode(), 6)
+            with open(self.log_path, "ab") as f:
+                f.write(data)
+        with open(self.index_path, "ab") as f:
+            f.write(ARCHIVE_INDEX.pack(first, self.size, len(data), len(lines)))
+        with self._lock:
+            self.firsts.append(first)
+            self.blocks.append((self.size, len(data), len(lines)))
+            self.size += len(data)
+            self._queue.popleft()
+            self._remap()
+
+    def _block_lines(self, i: int) -> Union[list[str], ArchiveGap]:
+        offset, size, count = self.blocks[i]
+        if size == 0:
+            return ArchiveGap(count)
+        lines = self._cache.get(i)
+        if lines is None:
+            lines = zlib.decompress(self._map[offset:offset + size]).decode().split("\n")[:-1]
+            self._cache[i] = lines
+            if len(self._cache) > ARCHIVE_CACHE_BLOCKS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(i)
+        return lines
+
+    def read(self, start: int, end: int) -> list[str]:
+        """Lines [start, end); lost lines read as an ArchiveGap marker."""
+        out = []
+        with self._lock:
+            i = max(bisect.bisect_right(self.firsts, start) - 1, 0)
+            chunks = [(self.firsts[j], None, j) for j in range(i, len(self.blocks))]
+            chunks += [(first, lines, None) for first, lines in self._queue]
+            chunks.append((self.pending_first, self.pending, None))
+            line = start
+            for first, lines, block in chunks:
+                if line >= end:
+                    break
+                if lines is None:
+                    if first + self.blocks[block][2] <= line:
+                        continue
+                    if first >= end:
+                        out.extend([""] * (end - line))
+                        break
+                    lines = self._block_lines(block)
+                if first > line:
+                    out.extend([""] * (min(first, end) - line))
+                    line = min(first, end)
+                out.extend(lines[line - first:end - first])
+                line = max(line, min(first + len(lines), end))
+        return out
+
+    def gaps(self, start: int, end: int) -> list[list[int]]:
+        """Ranges of lost lines overlapping [start, end)."""
+        with self._lock:
+            found = [(first, count) for first, (_, size, count) in zip(self.firsts, self.blocks)
+                     if size == 0]
+            found += [(first, len(lines)) for first, lines in self._queue
+                      if isinstance(lines, ArchiveGap)]
+        return [[first, first + count] for first, count in found
+                if first < end and first + count > start]
+
+    def stats(self) -> dict:
+        return {
+            "first": self.first, "total": self.total, "blocks": len(self.blocks),
+            "bytes": self.size, "gaps": self.gap_count, "pending": len(self.pending) + sum(
+                len(lines) for _, lines in self._queue if not isinstance(lines, ArchiveGap)),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+
+_archives: dict[str, ScrollbackArchive] = {}
+
+
+def scrollback_archive(target: str) -> Optional[ScrollbackArchive]:
+    """The archive for `target`, or None when ARCHIVE_DIR is unset."""
+    if not ARCHIVE_DIR:
+        return None
+    archive = _archives.get(target)
+    if archive is None:
+        archive = _archives[target] = ScrollbackArchive(Path(ARCHIVE_DIR) / target)
+    return archive
+
+
+@background_task
+async def archive_panes():
+    """Keep every pane's mirror, and with it its archive, up to date.
+
+    A cheap pane listing every ARCHIVE_CHECK_INTERVAL spots panes whose
+    history grew, or that are near history-limit (where history_size stops
+    growing) and had output; those refresh at once. Fast scrollers also
+    refresh sooner (see archive_interval), idle panes every ARCHIVE_INTERVAL.
+    """
+    if not ARCHIVE_DIR:
+        return
+    panes: dict[str, str] = {}
+    seen: dict[str, tuple] = {}
+    due: dict[str, float] = {}
+    listed = 0.0
+    while True:
+        try:
+            if time.monotonic() - listed >= ARCHIVE_CHECK_INTERVAL:
+                result = await tmux(
+                    "list-panes", "-a", "-F",
+                    "#{pane_id}|#{history_size}|#{history_limit}|#{window_activity}|#{session_name}",
+                )
+                panes = {}
+                for line in result.stdout.splitlines():
+                    try:
+                        pane_id, hsize, limit, activity, session = line.split("|", 4)
+                        near_limit = int(hsize) >= int(limit) * 3 // 4
+                    except ValueError:
+                        continue
+                    panes[pane_id] = session
+                    state = (hsize, activity if near_limit else None)
+                    if seen.get(pane_id) != state:
+                        due[pane_id] = 0
+                    seen[pane_id] = state
+                seen = {pane_id: state for pane_id, state in seen.items() if pane_id in panes}
+                due = {pane_id: at for pane_id, at in due.items() if pane_id in panes}
+                await drop_closed_panes(panes)
+                listed = time.monotonic()
+            for pane_id, session in panes.items():
+                if due.get(pane_id, 0) > time.monotonic():
+                    continue
+                mirror = scrollback_mirror(session, pane_id)
+                await mirror.refresh()
+                due[pane_id] = time.monotonic() + mirror.archive_interval()
+            for archive in list(_archives.values()):
+                if archive.due():
+                    await archive.flush(force=True)
+        except CommandTimeout:
+            pass
+        except OSError as e:
+            print(f"scrollback archive failed: {e}")
+        wake = min([listed + ARCHIVE_CHECK_INTERVAL, *due.values()])
+        await asyncio.sleep(max(wake - time.monotonic(), ARCHIVE_MIN_INTERVAL))
+
+
+async def drop_closed_panes(panes: dict[str, str]):
+    """Forget mirrors of panes that no longer exist, closing their archives."""
+    for pane_id, mirror in list(_scrollback_mirrors.items()):
+        if pane_id in panes or mirror._subscribers:
             continue
-        parts = line.split("|")
-        if len(parts) < 4:
+        del _scrollback_mirrors[pane_id]
+        archive = mirror.archive
+        if archive is not None:
+            await archive.flush(force=True)
+            archive.close()
+            for key, value in list(_archives.items()):
+                if value is archive:
+                    del _archives[key]
+
+
+@on_shutdown
+async def flush_archives():
+    for archive in _archives.values():
+        try:
+            await archive.flush(force=True)
+        except OSError as e:
+            print(f"scrollback archive flush failed: {e}")
+        archive.close()
+
+
+@app.get("/archive")
+async def archive_stats():
+    """Lines and on-disk size of each session's scrollback archive."""
+    return {
+        "enabled": bool(ARCHIVE_DIR),
+        "archives": {target: a.stats() for target, a in _archives.items()},
+    }
+
+
+# ── scrollback search ───────────────────────────────────────────────────
+# Queries run against the scrollback mirror, so finding an error in a long
+# transcript costs a few kilobytes of matches rather than the whole history.
+# A user regex can backtrack for practically ever on one line, and a thread
+# can't be stopped: regex searches run in a spawned worker process that is
+# killed after SEARCH_TIMEOUT.
+
+SEARCH_MAX_QUERY = 256
+SEARCH_MAX_RESULTS = 200
+SEARCH_MAX_CONTEXT = 10
+SEARCH_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", "2"))
+
+_search_pool = None  # multiprocessing pool with one worker, started on first use
+
+
+def search_lines(lines: list[str], base: int, pattern: re.Pattern, before: Optional[int],
+                 limit: int, context: int) -> tuple[list[dict], Optional[int]]:
+    """Matches above absolute line `before`, newest first.
+
+    Returns up to `limit` matches and the `before` to pass for the next
+    page, or None when there are no older matches.
+    """
+    end = len(lines) if before is None else min(max(before - base, 0), len(lines))
+    matches = []
+    for i in range(end - 1, -1, -1):
+        if not pattern.search(lines[i]):
             continue
-        idx, name, active, cmd = parts[0], parts[1], parts[2], parts[3]
-        windows.append({
-            "index": int(idx), "name": name,
-            "active": active == "1", "command": cmd,
+        if len(matches) == limit:
+            return matches, matches[-1]["line"]
+        matches.append({
+            "line": base + i,
+            "text": lines[i],
+            "before": lines[max(i - context, 0):i],
+            "after": lines[i + 1:i + 1 + context],
         })
-    return {"windows": windows}
+    return matches, None
 
 
-@app.post("/tmux/window/select")
-async def select_window(payload: dict):
-    """Switch to the specified tmux window."""
-    idx = payload["index"]
-    subprocess.run(
-        [TMUX, "select-window", "-t", f"{TMUX_SESSION}:{idx}"],
-        timeout=5,
-    )
-    return {"status": "switched", "index": idx}
+async def search_in_worker(*args) -> tuple[list[dict], Optional[int]]:
+    """search_lines in the worker process; raises TimeoutError after SEARCH_TIMEOUT."""
+    global _search_pool
+    if _search_pool is None:
+        pool = multiprocessing.get_context("spawn").Pool(1, **spawned_workers())
+        await asyncio.to_thread(pool.apply, len, ((),))  # wait out the worker's startup
+        if _search_pool is None:
+            _search_pool = pool
+        else:
+            pool.terminate()
+    pool = _search_pool
+    try:
+        return await asyncio.to_thread(pool.apply_async(search_lines, args).get, SEARCH_TIMEOUT)
+    except multiprocessing.TimeoutError:
+        if _search_pool is pool:
+            _search_pool = None
+        pool.terminate()  # the only way to stop a runaway regex
+        raise TimeoutError
 
 
-@app.post("/tmux/window/new")
-async def new_window(payload: dict = {}):
-    """Create a new tmux window, optionally running a command."""
-    cmd = [TMUX, "new-window", "-t", TMUX_SESSION]
-    if payload.get("command"):
-        cmd.extend(["-n", "shell", payload["command"]])
-    subprocess.run(cmd, timeout=5)
-    return {"status": "created"}
+@on_shutdown
+async def stop_search_pool():
+    if _search_pool is not None:
+        _search_pool.terminate()
 
 
-@app.post("/tmux/window/close")
-async def close_window(payload: dict):
-    """Close the specified tmux window."""
-    idx = payload["index"]
-    subprocess.run(
-        [TMUX, "kill-window", "-t", f"{TMUX_SESSION}:{idx}"],
-        timeout=5,
-    )
-    return {"status": "closed", "index": idx}
+@app.get("/search")
+async def search_scrollback(request: Request, q: str, regex: bool = False, case: bool = False,
+                            context: int = 2, limit: int = 50, before: Optional[int] = None,
+                            session: str = Depends(session_param)):
+    """Search the pane's scrollback for a substring (or `regex=1` pattern).
 
+    Newest matches come first; pass `before=<next_before>` from a response
+    for the next page. Line numbers are the same absolute numbers /copy
+    uses. Case-insensitive unless `case=1`.
+    """
+    if not q or len(q) > SEARCH_MAX_QUERY:
+        raise HTTPException(status_code=400, detail=f"query must be 1-{SEARCH_MAX_QUERY} characters")
+    try:
+        pattern = re.compile(q if regex else re.escape(q), 0 if case else re.IGNORECASE)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"invalid regex: {e}")
+    mirror = await session_mirror(session)
+    await mirror.refresh()
+    # refresh() swaps in new lists rather than mutating, so this is a stable snapshot
+    lines, base, total = mirror.lines, mirror.base, mirror.total
+    args = (lines, base, pattern, before,
+            min(max(limit, 1), SEARCH_MAX_RESULTS), min(max(context, 0), SEARCH_MAX_CONTEXT))
+    if not regex:
+        matches, next_before = await asyncio.to_thread(search_lines, *args)
+    else:
+        try:
+            matches, next_before = await search_in_worker(*args)
+        except TimeoutError:
+            raise HTTPException(status_code=400,
+                                detail=f"regex took longer than {SEARCH_TIMEOUT:g}s; try a simpler one")
+    payload = {
+        "query": q,
+        "matches": matches,
+        "next_before": next_before,
+        "base": base,
+        "total": total,
+    }
+    return encoded_response(request, json.dumps(payload).encode(), "application/json",
+                            {"Cache-Control": "no-cache"})
 
-@app.post("/tmux/exec")
-async def exec_command(payload: dict):
-    """Send a shell command to a specific tmux window."""
-    target = payload.get("window", "")
-    command = payload["command"]
-    t = f"{TMUX_SESSION}:{target}" if target else TMUX_SESSION
-    subprocess.run([TMUX, "send-keys", "-t", t, "-l", command], timeout=5)
-    subprocess.run([TMUX, "send-keys", "-t", t, "Enter"], timeout=5)
-    return {"status": "sent"}
 
+# ── screen mirror ───────────────────────────────────────────────────────
+# The visible screen of a pane, kept on the server with a version per row.
+# A client sends the version it last saw and gets only the rows changed
+# since, at most SCREEN_MAX_FPS times a second however chatty the pane is.
+# /screen serves the whole screen as one frame for a phone that just woke.
 
-## ── file upload ────────────────────────────────────────────────────────
+SCREEN_MAX_FPS = float(os.environ.get("SCREEN_MAX_FPS", "4"))
+SCREEN_SNAPSHOT_INTERVAL = float(os.environ.get("SCREEN_SNAPSHOT_INTERVAL", "2"))
 
-UPLOAD_DIR = Path("/tmp/claude-uploads")
-MAX_UPLOAD_SIZE = 20 * 1024 * 1024  # 20 MB
 
+class ScreenMirror(PaneMirror):
+    """Rows of one pane's visible screen, each tagged with the version that last changed it."""
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Save an uploaded file using its original name and return the path."""
-    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    # Sanitize filename: strip path components and special characters
-    raw_name = file.filename or "photo.jpg"
-    name = Path(raw_name).name
-    name = re.sub(r'[^\w.\-]', '_', name)
-    if not name or name.startswith('.'):
-        name = "photo.jpg"
-    dest = UPLOAD_DIR / name
-    # Handle duplicate filenames with a counter suffix
-    counter = 2
-    while dest.exists():
-        stem = Path(name).stem
-        ext = Path(name).suffix
-        dest = UPLOAD_DIR / f"{stem}-{counter}{ext}"
-        counter += 1
-    # Stream-read with size limit to avoid memory exhaustion
-    chunks = []
-    total = 0
-    while chunk := await file.read(1024 * 1024):
-        total += len(chunk)
-        if total > MAX_UPLOAD_SIZE:
-            return {"error": "File too large (max 20MB)"}
-        chunks.append(chunk)
-    dest.write_bytes(b"".join(chunks))
-    return {"name": dest.name, "path": str(dest)}
+    MIN_INTERVAL = 1 / SCREEN_MAX_FPS
+
+    def __init__(self, target: str, session: str):
+        super().__init__(target, session)
+        self.rows: list[str] = []
+        self.row_versions: list[int] = []
+        self.cursor = (0, 0)
+        self.size = (0, 0)
+        self.reset_version = 0  # clients older than this need every row (resize)
+        self.updated_at = 0.0
+        self.checked_at = 0.0  # monotonic time of the last refresh
+
+    async def refresh(self) -> bool:
+        """Bring the screen up to date; returns True if anything changed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self.checked_at = time.monotonic()
+            control = control_client(self.session)
+            output_seq = control.output_seq
+            info = await tmux(
+                "display-message", "-p", "-t", self.target,
+                "#{cursor_x} #{cursor_y} #{pane_width} #{pane_height} #{window_activity}",
+                session=self.session,
+            )
+            try:
+                cursor_x, cursor_y, width, height, activity = (int(v) for v in info.stdout.split())
+            except ValueError:
+                return False
+            state = (cursor_x, cursor_y, width, height, activity,
+                     output_seq if control.connected else None)
+            if state == self._state and (control.connected or time.time() - activity >= 1):
+                return False
+            result = await tmux("capture-pane", "-p", "-t", self.target, session=self.session)
+            if result.returncode != 0:
+                return False
+            self._state = state
+            rows = _split_lines(result.stdout)[:height]
+            rows += [""] * (height - len(rows))
+            version = self.version + 1
+            if (width, height) != self.size:
+                self.row_versions = [version] * height
+                self.reset_version = version
+            elif rows == self.rows and (cursor_x, cursor_y) == self.cursor:
+                return False
+            else:
+                for i, row in enumerate(rows):
+                    if row != self.rows[i]:
+                        self.row_versions[i] = version
+            self.rows, self.cursor, self.size = rows, (cursor_x, cursor_y), (width, height)
+            self.updated_at = time.time()
+            self._bump()
+            return True
+
+    def frame_since(self, version: int) -> dict:
+        """The rows a client at `version` is missing (every row if it is too old)."""
+        full = version < self.reset_version
+        return {
+            "version": self.version,
+            "full": full,
+            "width": self.size[0],
+            "height": self.size[1],
+            "cursor": list(self.cursor),
+            "rows": {
+                i: row for i, (row, v) in enumerate(zip(self.rows, self.row_versions))
+                if full or v > version
+            },
+        }
+
+    async def watch(self, version: int = 0):
+        """Yield a frame now, then one per change (None = idle).
+
+        The next frame is only built once the previous one has been
+        consumed, so a slow client's backlog collapses into a single frame
+        of every row changed meanwhile instead of queueing up.
+        """
+        self._subscribe()
+        try:
+            await self.refresh()
+            frame = self.frame_since(version)
+            version = frame["version"]
+            yield frame
+            while True:
+                if not await self.wait_changed(version, SSE_KEEPALIVE):
+                    yield None
+                    continue
+                frame = self.frame_since(version)
+                version = frame["version"]
+                yield frame
+        finally:
+            self._subscribers -= 1
+
+
+_screen_mirrors: dict[str, ScreenMirror] = {}
+
+
+def screen_mirror(session: str, target: Optional[str] = None) -> ScreenMirror:
+    """The shared screen mirror of `target` (default: the session's active pane)."""
+    target = target or session
+    mirror = _screen_mirrors.get(target)
+    if mirror is None:
+        mirror = _screen_mirrors[target] = ScreenMirror(target, session)
+    return mirror
+
+
+@background_task
+async def refresh_screen_snapshots():
+    """Keep the screens of claimed sessions current while phones sleep."""
+    while True:
+        for session, state in list(active_sessions.items()):
+            if state["id"] is None:
+                continue
+            mirror = screen_mirror(session)
+            if mirror._subscribers:
+                continue  # a /screen/stream pump is already refreshing it
+            try:
+                await mirror.refresh()
+            except CommandTimeout:
+                pass
+        await asyncio.sleep(SCREEN_SNAPSHOT_INTERVAL)
+
+
+@app.get("/screen")
+async def screen_snapshot(request: Request, session: str = Depends(session_param)):
+    """The visible screen as one full frame, for drawing at once on wake.
+
+    The ETag is the frame version, so a phone that saw this screen before
+    sleeping gets a 304.
+    """
+    mirror = screen_mirror(session)
+    # checked_at is set when a refresh starts: without a version yet, wait
+    # for the one in flight instead of reporting the pane missing
+    if not mirror.version or time.monotonic() - mirror.checked_at >= mirror.MIN_INTERVAL:
+        await mirror.refresh()
+    if not mirror.version:
+        raise HTTPException(status_code=404, detail="pane not found")
+    etag = f'"{BOOT_ID}-{mirror.version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    frame = {**mirror.frame_since(0), "updated_at": mirror.updated_at}
+    return encoded_response(request, json.dumps(frame).encode(), "application/json", headers)
+
+
+@app.get("/screen/stream")
+async def screen_stream(request: Request, session: str = Depends(session_param)):
+    """Server-sent events: `frame`s of changed screen rows, rate-capped.
+
+    Event ids carry the frame version, so a reconnecting EventSource (which
+    sends Last-Event-ID) gets only the rows that changed while it was away.
+    """
+    boot, _, seen = request.headers.get("last-event-id", "").partition("-")
+    version = int(seen) if boot == BOOT_ID and seen.isdigit() else 0
+
+    async def events():
+        async for frame in screen_mirror(session).watch(version):
+            if frame is None:
+                yield ": keepalive\n\n"
+            else:
+                yield sse_event("frame", frame, f"{BOOT_ID}-{frame['version']}")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ── lite page ───────────────────────────────────────────────────────────
+# A text-only terminal for weak connections: rows from /screen/stream
+# instead of ttyd's raw byte stream, plus the usual input bar and keys.
+
+lite_page: Optional[RenderedPage] = None
+
+
+@app.get("/lite", response_class=HTMLResponse)
+async def lite(request: Request):
+    global lite_page
+    if lite_page is None:
+        lite_page = RenderedPage(render_lite())
+    return page_response(request, lite_page)
+
+
+def render_lite() -> str:
+    return """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
+    <meta name="apple-mobile-web-app-capable" content="yes">
+    <title>Claude Code (lite)</title>
+    <style>
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        html, body {
+            height: 100%;
+            background: #1e1e1e;
+            color: #e0e0e0;
+            font-family: -apple-system, system-ui, sans-serif;
+            overflow: hidden;
+        }
+        .container { display: flex; flex-direction: column; height: 100%; height: 100dvh; }
+        .status {
+            display: flex;
+            justify-content: space-between;
+            padding: 4px 8px;
+            font-size: 12px;
+            color: #888;
+            background: #2d2d2d;
+        }
+        .status a { color: #4da3ff; text-decoration: none; }
+        #screen {
+            flex: 1;
+            overflow: auto;
+            padding: 4px;
+            font-family: Menlo, Monaco, Consolas, monospace;
+            font-size: 12px;
+            line-height: 1.2;
+            white-space: pre;
+        }
+        #screen .cursor { background: #e0e0e0; color: #1e1e1e; }
+        .quick-keys {
+            display: flex;
+            gap: 6px;
+            padding: 6px 8px;
+            overflow-x: auto;
+            background: #2d2d2d;
+        }
+        .quick-keys button, .input-bar button {
+            flex-shrink: 0;
+            padding: 8px 12px;
+            font-size: 14px;
+            border: none;
+            border-radius: 6px;
+            background: #444;
+            color: #fff;
+        }
+        .input-bar { display: flex; gap: 8px; padding: 8px; background: #2d2d2d; }
+        .input-bar input {
+            flex: 1;
+            padding: 10px;
+            font-size: 16px;
+            border: 1px solid #555;
+            border-radius: 8px;
+            background: #1a1a1a;
+            color: #fff;
+        }
+        .input-bar button { background: #007aff; font-weight: 600; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="status">
+            <span id="state">connecting…</span>
+            <a id="fullLink" href="/">Full terminal</a>
+        </div>
+        <div id="screen"></div>
+        <div class="quick-keys">
+            <button onclick="sendKey('Up')">&#9650;</button>
+            <button onclick="sendKey('Down')">&#9660;</button>
+            <button onclick="sendKey('Tab')">Tab</button>
+            <button onclick="sendKey('Escape')">Esc</button>
+            <button onclick="sendKey('C-c')">Ctrl+C</button>
+            <button onclick="sendKey('Enter')">Enter</button>
+        </div>
+        <div class="input-bar">
+            <input id="cmd" placeholder="Dictate or type here..." autocomplete="off" enterkeyhint="send">
+            <button onclick="sendText()">Send</button>
+        </div>
+    </div>
+    <script>
+        const SESSION = new URLSearchParams(location.search).get('session') || '';
+        function api(path) {
+            if (!SESSION) return path;
+            return path + (path.includes('?') ? '&' : '?') + 'session=' + encodeURIComponent(SESSION);
+        }
+        document.getElementById('fullLink').href = '/' + location.search;
+
+        const screen = document.getElementById('screen');
+        const state = document.getElementById('state');
+        let rows = [];
+        let rowEls = [];
+        let cursor = [0, 0];
+
+        function renderRow(i) {
+            const el = rowEls[i];
+            const text = rows[i] || '';
+            if (i !== cursor[1]) {
+                el.textContent = text || ' ';
+                return;
+            }
+            const padded = text.padEnd(cursor[0] + 1, ' ');
+            const mark = document.createElement('span');
+            mark.className = 'cursor';
+            mark.textContent = padded[cursor[0]];
+            el.replaceChildren(padded.slice(0, cursor[0]), mark, padded.slice(cursor[0] + 1));
+        }
+
+        function applyFrame(frame) {
+            if (frame.full || rowEls.length !== frame.height) {
+                rows = new Array(frame.height).fill('');
+                rowEls = rows.map(() => document.createElement('div'));
+                screen.replaceChildren(...rowEls);
+                // Fit the pane width to the phone screen
+                const size = Math.min(14, Math.max(7, (screen.clientWidth - 8) / (frame.width * 0.6)));
+                screen.style.fontSize = size.toFixed(1) + 'px';
+            }
+            const oldCursorRow = cursor[1];
+            cursor = frame.cursor;
+            for (const [i, text] of Object.entries(frame.rows)) {
+                rows[i] = text;
+                renderRow(+i);
+            }
+            if (oldCursorRow !== cursor[1] && rowEls[oldCursorRow]) renderRow(oldCursorRow);
+            renderRow(cursor[1]);
+        }
+
+        function connect() {
+            // EventSource resumes with Last-Event-ID, so reconnects only get changed rows
+            const stream = new EventSource(api('/screen/stream'));
+            stream.addEventListener('frame', (e) => {
+                state.textContent = 'live';
+                applyFrame(JSON.parse(e.data));
+            });
+            stream.onerror = () => { state.textContent = 'reconnecting…'; };
+        }
+
+        async function post(path, body) {
+            await fetch(api(path), {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(body),
+            });
+        }
+
+        const input = document.getElementById('cmd');
+        async function sendText() {
+            const text = input.value;
+            if (!text) return;
+            input.value = '';
+            await post('/send', { text });
+        }
+        function sendKey(key) { post('/key', { key }); }
+        input.addEventListener('keydown', (e) => {
+            if (e.key === 'Enter' && !e.isComposing) {
+                e.preventDefault();
+                sendText();
+            }
+        });
+
+        connect();
+    </script>
+</body>
+</html>
+"""
+
+
+# ── tmux window management ──────────────────────────────────────────────
+
+@app.get("/tmux/windows")
+async def list_windows(session: str = Depends(session_param)):
+    """List all tmux windows in the session."""
+    result = await tmux(
+        "list-windows", "-t", session,
+        "-F", "#{window_index}|#{window_name}|#{window_active}|#{pane_current_command}",
+        session=session,
+    )
+    windows = []
+    for line in result.stdout.strip().split("\n"):
+        if not line:
+            continue
+        parts = line.split("|")
+        if len(parts) < 4:
+            continue
+        idx, name, active, cmd = parts[0], parts[1], parts[2], parts[3]
+        windows.append({
+            "index": int(idx), "name": name,
+            "active": active == "1", "command": cmd,
+        })
+    return {"windows": windows}
+
+
+@app.post("/tmux/window/select")
+async def select_window(payload: dict, session: str = Depends(session_param)):
+    """Switch to the specified tmux window."""
+    idx = payload["index"]
+    await tmux("select-window", "-t", f"{session}:{idx}", session=session)
+    return {"status": "switched", "index": idx}
+
+
+@app.post("/tmux/window/new")
+async def new_window(payload: dict = {}, session: str = Depends(session_param)):
+    """Create a new tmux window, optionally running a command."""
+    args = ["new-window", "-t", session]
+    if payload.get("command"):
+        args.extend(["-n", "shell", payload["command"]])
+    await tmux(*args, session=session)
+    return {"status": "created"}
+
+
+@app.post("/tmux/window/close")
+async def close_window(payload: dict, session: str = Depends(session_param)):
+    """Close the specified tmux window."""
+    idx = payload["index"]
+    await tmux("kill-window", "-t", f"{session}:{idx}", session=session)
+    return {"status": "closed", "index": idx}
+
+
+@app.post("/tmux/exec")
+async def exec_command(payload: dict, session: str = Depends(session_param)):
+    """Send a shell command to a specific tmux window."""
+    target = payload.get("window", "")
+    command = payload["command"]
+    t = f"{session}:{target}" if target else session
+    await tmux_sequence(
+        ("send-keys", "-t", t, "-l", command),
+        ("send-keys", "-t", t, "Enter"),
+        session=session,
+    )
+    return {"status": "sent"}
+
+
+# ── fleet status ────────────────────────────────────────────────────────
+# Everything a dashboard needs about every session in one response: a
+# single `list-panes -a` plus one pipelined capture per pane, cached for
+# STATUS_TTL and pushed to /status/stream subscribers when it changes.
+
+STATUS_TTL = float(os.environ.get("STATUS_TTL", "1"))
+STATUS_LINES = 5
+STATUS_MAX_LINES = 50
+STATUS_PANE_FORMAT = "|".join([
+    "#{session_name}", "#{window_index}", "#{window_active}", "#{window_activity}",
+    "#{pane_id}", "#{pane_index}", "#{pane_active}", "#{pane_dead}",
+    "#{pane_current_command}", "#{window_name}",
+])
+
+_status_cache: dict[int, tuple[float, dict]] = {}  # lines -> (time, status)
+_status_lock: Optional[asyncio.Lock] = None
+status_events = Broadcaster(maxsize=8)
+
+
+async def tmux_batch(commands: list[tuple[str, ...]], session: str = TMUX_SESSION) -> list[CommandResult]:
+    """Run independent tmux commands together.
+
+    Over control mode they are pipelined on one connection; otherwise they
+    run as concurrent forks within TMUX_CONCURRENCY.
+    """
+    return await asyncio.gather(*(tmux(*cmd, session=session) for cmd in commands))
+
+
+def _tail_lines(text: str, n: int) -> list[str]:
+    lines = _split_lines(text)
+    while lines and not lines[-1].strip():
+        lines.pop()
+    return lines[-n:] if n else []
+
+
+async def collect_status(lines: int) -> dict:
+    result = await tmux("list-panes", "-a", "-F", STATUS_PANE_FORMAT)
+    panes = []
+    for row in result.stdout.splitlines():
+        parts = row.split("|", 9)
+        if len(parts) == 10:
+            panes.append(parts)
+    captures = await tmux_batch([("capture-pane", "-p", "-t", p[4]) for p in panes])
+    sessions: dict[str, dict] = {}
+    for parts, capture in zip(panes, captures):
+        (session, win_index, win_active, activity, pane_id, pane_index,
+         pane_active, dead, command, win_name) = parts
+        windows = sessions.setdefault(session, {})
+        window = windows.setdefault(win_index, {
+            "index": int(win_index), "name": win_name, "active": win_active == "1",
+            "activity": int(activity or 0), "panes": [],
+        })
+        window["panes"].append({
+            "id": pane_id, "index": int(pane_index), "active": pane_active == "1",
+            "command": command, "dead": dead == "1",
+            "lines": _tail_lines(capture.stdout, lines),
+            "hash": hashlib.sha1(capture.stdout.encode()).hexdigest()[:12],
+        })
+    return {
+        "generated_at": time.time(),
+        "sessions": [
+            {"name": name, "claimed_by": claim_state(name)["device"],
+             "windows": list(windows.values())}
+            for name, windows in sessions.items()
+        ],
+    }
+
+
+async def fleet_status(lines: int = STATUS_LINES) -> dict:
+    """Cached status of every session, window and pane."""
+    global _status_lock
+    if _status_lock is None:
+        _status_lock = asyncio.Lock()
+    async with _status_lock:
+        cached = _status_cache.get(lines)
+        if cached and time.monotonic() - cached[0] < STATUS_TTL:
+            return cached[1]
+        status = await collect_status(lines)
+        _status_cache[lines] = (time.monotonic(), status)
+        return status
+
+
+def status_digest(status: dict) -> str:
+    """Hash of everything in a status except its timestamp."""
+    return hashlib.sha1(json.dumps(status["sessions"], sort_keys=True).encode()).hexdigest()
+
+
+@background_task
+async def status_publisher():
+    """Poll fleet status while anyone is subscribed; publish when it changes."""
+    last = None
+    while True:
+        if status_events.subscribers:
+            try:
+                status = await fleet_status()
+            except CommandTimeout:
+                status = None
+            if status is not None and status_digest(status) != last:
+                last = status_digest(status)
+                status_events.publish(status)
+        else:
+            last = None
+        await asyncio.sleep(max(STATUS_TTL, 0.5))
+
+
+@app.get("/status")
+async def status(request: Request, lines: int = STATUS_LINES):
+    """Every session, window and pane with its command, activity, last lines and hash."""
+    status = await fleet_status(min(max(lines, 0), STATUS_MAX_LINES))
+    etag = '"%s"' % status_digest(status)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return encoded_response(request, json.dumps(status).encode(), "application/json",
+                            {"ETag": etag, "Cache-Control": "no-cache"})
+
+
+@app.get("/status/stream")
+async def status_stream():
+    """Server-sent events: the fleet status now, then again whenever it changes."""
+    async def events():
+        with status_events.subscribe() as updates:
+            status = await fleet_status()
+            sent = status_digest(status)
+            yield sse_event("status", status)
+            while True:
+                status = await updates.get()
+                if status is None:
+                    yield ": keepalive\n\n"
+                elif status_digest(status) != sent:
+                    sent = status_digest(status)
+                    yield sse_event("status", status)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ── host federation ─────────────────────────────────────────────────────
+# With PEERS set, this wrapper also fronts the wrappers on other machines.
+# /hosts/status and /hosts/windows ask every host at once over pooled
+# keep-alive connections (revalidating with each peer's ETag), so checking
+# the whole fleet costs the phone one request; /hosts/<name>/... forwards
+# input to one of them.
+
+PEER_TIMEOUT = float(os.environ.get("PEER_TIMEOUT", "3"))
+PEER_CACHE_TTL = float(os.environ.get("PEER_CACHE_TTL", "2"))
+HOST_NAME = os.environ.get("HOST_NAME", "") or platform.node().split(".")[0] or "local"
+PEER_PROXY_POST = {"send", "key", "send/sequence",
+                   "tmux/window/select", "tmux/window/new", "tmux/window/close"}
+PEER_PROXY_GET = {"sessions", "tmux/windows", "copy/range", "search", "status"}
+
+
+def parse_peers(spec: str) -> dict[str, str]:
+    """`name=http://host:port` entries, comma-separated; a bare URL is named by its host."""
+    peers = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep:
+            name, url = "", item
+        if "://" not in url:
+            url = "http://" + url
+        url = url.rstrip("/")
+        peers[name.strip() or urllib.parse.urlsplit(url).hostname] = url
+    return peers
+
+
+PEERS = parse_peers(os.environ.get("PEERS", ""))
+
+
+class PeerError(Exception):
+    pass
+
+
+_peer_client = None
+_peer_responses: dict[tuple, tuple[str, object]] = {}  # (peer, path, params) -> (etag, data)
+_hosts_cache: dict[tuple, tuple[float, dict]] = {}
+_hosts_locks: dict[tuple, asyncio.Lock] = {}
+
+
+@on_startup
+async def check_peers():
+    if PEERS and httpx is None:
+        print("PEERS is set but httpx is not installed (pip install httpx); peers are skipped")
+
+
+@on_shutdown
+async def close_peer_client():
+    if _peer_client is not None:
+        await _peer_client.aclose()
+
+
+def peer_client():
+    """One pooled client for every peer, so connections stay warm."""
+    global _peer_client
+    if _peer_client is None:
+        _peer_client = httpx.AsyncClient(
+            timeout=PEER_TIMEOUT,
+            limits=httpx.Limits(max_connections=8 * max(len(PEERS), 1),
+                                max_keepalive_connections=4 * max(len(PEERS), 1),
+                                keepalive_expiry=60),
+        )
+    return _peer_client
+
+
+async def peer_get(peer: str, path: str, params: dict):
+    """GET JSON from a peer, reusing the last answer when it replies 304."""
+    if httpx is None:
+        raise PeerError("httpx not installed")
+    key = (peer, path, tuple(sorted(params.items())))
+    cached = _peer_responses.get(key)
+    start = time.perf_counter()
+    try:
+        response = await peer_client().get(
+            PEERS[peer] + path, params=params,
+            headers={"If-None-Match": cached[0]} if cached else {})
+    except httpx.HTTPError as e:
+        peer_duration.observe(time.perf_counter() - start, peer=peer, result="error")
+        raise PeerError(str(e) or type(e).__name__)
+    if response.status_code == 304 and cached:
+        peer_duration.observe(time.perf_counter() - start, peer=peer, result="not_modified")
+        return cached[1]
+    if response.status_code != 200:
+        peer_duration.observe(time.perf_counter() - start, peer=peer, result="error")
+        raise PeerError(f"HTTP {response.status_code}")
+    peer_duration.observe(time.perf_counter() - start, peer=peer, result="ok")
+    data = response.json()
+    if response.headers.get("etag"):
+        _peer_responses[key] = (response.headers["etag"], data)
+    return data
+
+
+async def fan_out(field: str, local: Callable, path: str, params: dict) -> dict:
+    """Ask this host and every peer at once; a failed host is reported, not raised."""
+    async def ask(name: str, fetch) -> dict:
+        entry = {"name": name, "url": PEERS.get(name), "local": fetch is local}
+        start = time.perf_counter()
+        try:
+            entry[field] = await fetch()
+            entry["ok"] = True
+        except (PeerError, CommandTimeout, HTTPException) as e:
+            entry.update(ok=False, error=str(e) or type(e).__name__)
+        entry["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return entry
+
+    fetchers = [(HOST_NAME, local)] + [
+        (name, lambda name=name: peer_get(name, path, params)) for name in PEERS]
+    return {"generated_at": time.time(),
+            "hosts": await asyncio.gather(*(ask(name, fetch) for name, fetch in fetchers))}
+
+
+async def cached_fan_out(field: str, local: Callable, path: str, params: dict) -> dict:
+    """fan_out() cached for PEER_CACHE_TTL; concurrent callers share one round."""
+    key = (path, tuple(sorted(params.items())))
+    lock = _hosts_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        cached = _hosts_cache.get(key)
+        if cached and time.monotonic() - cached[0] < PEER_CACHE_TTL:
+            return cached[1]
+        result = await fan_out(field, local, path, params)
+        _hosts_cache[key] = (time.monotonic(), result)
+        return result
+
+
+def hosts_digest(result: dict, field: str) -> str:
+    """Hash of every host's answer, ignoring timestamps and timings."""
+    def strip(data):
+        return {k: v for k, v in data.items() if k != "generated_at"} if isinstance(data, dict) else data
+    hosts = [(h["name"], h["ok"], h.get("error"), strip(h.get(field))) for h in result["hosts"]]
+    return hashlib.sha1(json.dumps(hosts, sort_keys=True).encode()).hexdigest()
+
+
+def hosts_response(request: Request, result: dict, field: str) -> Response:
+    etag = '"%s"' % hosts_digest(result, field)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return encoded_response(request, json.dumps(result).encode(), "application/json",
+                            {"ETag": etag, "Cache-Control": "no-cache"})
+
+
+@app.get("/hosts")
+async def hosts():
+    """This host's name and the peer wrappers it fronts."""
+    return {"self": HOST_NAME, "peers": PEERS, "enabled": httpx is not None}
+
+
+@app.get("/hosts/status")
+async def hosts_status(request: Request, lines: int = STATUS_LINES):
+    """/status from this host and every peer, in one response."""
+    lines = min(max(lines, 0), STATUS_MAX_LINES)
+    result = await cached_fan_out("status", lambda: fleet_status(lines), "/status", {"lines": lines})
+    return hosts_response(request, result, "status")
+
+
+@app.get("/hosts/windows")
+async def hosts_windows(request: Request, session: Optional[str] = None):
+    """/tmux/windows from every host (each host's default session unless given)."""
+    params = {"session": session} if session else {}
+
+    async def local():
+        return await list_windows(await session_param(session))
+
+    result = await cached_fan_out("windows", local, "/tmux/windows", params)
+    return hosts_response(request, result, "windows")
+
+
+@app.api_route("/hosts/{host}/{path:path}", methods=["GET", "POST"])
+async def proxy_to_host(host: str, path: str, request: Request):
+    """Forward input (and a few reads) to a peer, e.g. POST /hosts/box2/send."""
+    allowed = PEER_PROXY_POST if request.method == "POST" else PEER_PROXY_GET
+    if host not in PEERS or path not in allowed:
+        raise HTTPException(status_code=404, detail="unknown host or path")
+    if httpx is None:
+        raise HTTPException(status_code=503, detail="httpx not installed")
+    headers = {k: request.headers[k] for k in ("content-type", "if-none-match") if k in request.headers}
+    start = time.perf_counter()
+    try:
+        response = await peer_client().request(
+            request.method, f"{PEERS[host]}/{path}", params=request.query_params,
+            content=await request.body(), headers=headers)
+    except httpx.HTTPError as e:
+        peer_duration.observe(time.perf_counter() - start, peer=host, result="error")
+        raise HTTPException(status_code=502, detail=f"{host}: {e or type(e).__name__}")
+    peer_duration.observe(time.perf_counter() - start, peer=host, result="proxied")
+    out_headers = {k: response.headers[k] for k in ("etag", "cache-control") if k in response.headers}
+    if response.status_code != 200:
+        return Response(response.content, status_code=response.status_code, headers=out_headers,
+                        media_type=response.headers.get("content-type"))
+    return encoded_response(request, response.content,
+                            response.headers.get("content-type", "application/json"), out_headers)
+
+
+# ── activity detection ──────────────────────────────────────────────────
+# Tracks whether each pane is busy (producing output), idle, waiting at a
+# prompt, or exited, and pushes transitions to /activity/stream. Output
+# timing comes from control-mode %output notifications (window_activity
+# without control mode); the last lines are only captured when a pane goes
+# quiet, to match them against IDLE_PATTERNS.
+
+ACTIVITY_INTERVAL = float(os.environ.get("ACTIVITY_INTERVAL", "1"))
+IDLE_AFTER = float(os.environ.get("IDLE_AFTER", "3"))
+# Shell prompts are matched by shape (a bare sigil, user@host or a path
+# before it, or `bash-5.2$`), not just a trailing sigil, so output such as
+# "50%" doesn't read as waiting.
+IDLE_PATTERNS = [
+    re.compile(p) for p in os.environ.get(
+        "IDLE_PATTERNS",
+        r"Do you want to\b|\(y/n\)|\[Y/n\]|^\s*[│|]?\s*>\s*$|^\s*[$#%]\s*$"
+        r"|^\S*[@:~]\S*(?:\s\S+)?\s?(?<!\d)[$#%]\s*$|^[\w.-]*[A-Za-z][\w.-]*[$#]\s*$",
+    ).split("||") if p
+]
+ACTIVITY_PANE_FORMAT = "|".join([
+    "#{pane_id}", "#{session_name}", "#{window_index}", "#{pane_dead}",
+    "#{window_activity}", "#{pane_current_command}",
+])
+
+activity_events = Broadcaster()
+
+
+class PaneActivity:
+    def __init__(self, pane_id: str):
+        self.pane_id = pane_id
+        self.session = ""
+        self.window = 0
+        self.command = ""
+        self.state = "unknown"
+        self.since = time.time()
+        self.last_output = 0.0  # time.monotonic() of the last %output
+        self.output_rate = 0.0  # bytes/second, exponentially smoothed
+        self._bytes = 0
+        self.lines: list[str] = []
+
+    def as_dict(self) -> dict:
+        return {
+            "pane": self.pane_id, "session": self.session, "window": self.window,
+            "command": self.command, "state": self.state, "since": self.since,
+            "output_rate": round(self.output_rate, 1), "lines": self.lines,
+        }
+
+
+class ActivityWatcher:
+    def __init__(self):
+        self.panes: dict[str, PaneActivity] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def on_notification(self, line: str):
+        if not line.startswith("%output "):
+            return
+        pane_id, _, data = line[8:].partition(" ")
+        pane = self.panes.get(pane_id)
+        if pane is None:
+            pane = self.panes[pane_id] = PaneActivity(pane_id)
+        pane.last_output = time.monotonic()
+        pane._bytes += len(data)
+
+    async def _hook_sessions(self):
+        for info in await list_tmux_sessions():
+            name = info["name"]
+            control = control_client(name)
+            # A session closed and recreated under the same name gets a new client
+            if self.on_notification not in control.listeners:
+                control.listeners.append(self.on_notification)
+            try:
+                await control.ensure_connected()
+            except ControlConnectionError:
+                pass
+
+    async def poll(self):
+        if TMUX_CONTROL:
+            await self._hook_sessions()
+        result = await tmux("list-panes", "-a", "-F", ACTIVITY_PANE_FORMAT)
+        now, mono = time.time(), time.monotonic()
+        seen = set()
+        quiet = []
+        for row in result.stdout.splitlines():
+            parts = row.split("|", 5)
+            if len(parts) < 6:
+                continue
+            pane_id, session, window, dead, activity, command = parts
+            seen.add(pane_id)
+            pane = self.panes.get(pane_id)
+            if pane is None:
+                pane = self.panes[pane_id] = PaneActivity(pane_id)
+            pane.session, pane.window, pane.command = session, int(window), command
+            pane.output_rate = 0.7 * pane.output_rate + 0.3 * pane._bytes / ACTIVITY_INTERVAL
+            pane._bytes = 0
+            if control_client(session).connected:
+                idle_for = mono - pane.last_output if pane.last_output else IDLE_AFTER
+            else:
+                idle_for = now - int(activity or 0)
+            if dead == "1":
+                self._transition(pane, "exited")
+            elif idle_for < IDLE_AFTER:
+                self._transition(pane, "busy")
+            elif pane.state in ("busy", "unknown", "exited"):
+                quiet.append(pane)
+        # Only panes that just went quiet are captured for prompt matching
+        captures = await tmux_batch([("capture-pane", "-p", "-t", p.pane_id) for p in quiet])
+        for pane, capture in zip(quiet, captures):
+            pane.lines = _tail_lines(capture.stdout, STATUS_LINES)
+            waiting = any(pattern.search(line) for pattern in IDLE_PATTERNS
+                          for line in pane.lines[-2:])
+            self._transition(pane, "waiting" if waiting else "idle")
+        for pane_id in set(self.panes) - seen:
+            pane = self.panes.pop(pane_id)
+            if pane.state != "unknown":
+                self._transition(pane, "closed")
+
+    def _transition(self, pane: PaneActivity, state: str):
+        if pane.state == state:
+            return
+        previous, pane.state, pane.since = pane.state, state, time.time()
+        if state == "busy":
+            pane.lines = []
+        activity_events.publish({**pane.as_dict(), "previous": previous})
+
+    async def run(self):
+        """Poll while anyone is subscribed to activity events."""
+        try:
+            while activity_events.subscribers:
+                try:
+                    await self.poll()
+                except CommandTimeout:
+                    pass
+                await asyncio.sleep(ACTIVITY_INTERVAL)
+        finally:
+            self._task = None
+
+    def ensure_running(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+
+activity_watcher = ActivityWatcher()
+
+
+@app.get("/activity")
+async def activity():
+    """Current busy/idle/waiting/exited state of every pane."""
+    if activity_watcher._task is None:
+        await activity_watcher.poll()
+    return {"panes": [p.as_dict() for p in activity_watcher.panes.values()]}
+
+
+@app.get("/activity/stream")
+async def activity_stream():
+    """Server-sent events: a `state` event whenever a pane changes state."""
+    async def events():
+        with activity_events.subscribe() as updates:
+            activity_watcher.ensure_running()
+            yield sse_event("snapshot", {"panes": [p.as_dict() for p in activity_watcher.panes.values()]})
+            while True:
+                event = await updates.get()
+                yield ": keepalive\n\n" if event is None else sse_event("state", event)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ── file upload ─────────────────────────────────────────────────────────
+
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "/tmp/claude-uploads"))
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024  # 20 MB
+
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadNames:
+    """In-memory index of the names in UPLOAD_DIR.
+
+    Picks a free `stem-N.ext` name without probing the filesystem; the
+    next counter per stem is remembered so repeated names stay O(1).
+    Also maps the SHA-256 of this process's uploads to their names, so a
+    discarded name can never be handed out for a digest again.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.names: set[str] = set()
+        self._next_suffix: dict[tuple[str, str], int] = {}
+        self._by_digest: dict[str, str] = {}
+        self._digests: dict[str, str] = {}  # name -> sha256
+
+    def load(self):
+        try:
+            self.names = {e.name for e in os.scandir(self.directory)
+                          if not e.name.startswith(".")}
+        except FileNotFoundError:
+            self.names = set()
+        self._next_suffix.clear()
+        self._by_digest.clear()
+        self._digests.clear()
+
+    def reserve(self, name: str) -> str:
+        if name not in self.names:
+            self.names.add(name)
+            return name
+        stem, ext = Path(name).stem, Path(name).suffix
+        counter = self._next_suffix.get((stem, ext), 2)
+        while f"{stem}-{counter}{ext}" in self.names:
+            counter += 1
+        self._next_suffix[(stem, ext)] = counter + 1
+        candidate = f"{stem}-{counter}{ext}"
+        self.names.add(candidate)
+        return candidate
+
+    def discard(self, name: str):
+        self.names.discard(name)
+        digest = self._digests.pop(name, None)
+        if digest is not None and self._by_digest.get(digest) == name:
+            del self._by_digest[digest]
+
+    def remember(self, name: str, digest: str):
+        self._digests[name] = digest
+        self._by_digest[digest] = name
+
+    def find(self, digest: str) -> Optional[str]:
+        return self._by_digest.get(digest)
+
+
+upload_names = UploadNames(UPLOAD_DIR)
+
+
+@on_startup
+async def load_upload_names():
+    await asyncio.to_thread(upload_names.load)
+
+
+def _publish_exclusive(tmp: str, dest: Path):
+    # O_EXCL claims the name on disk even against other processes, then
+    # the finished file atomically replaces the empty placeholder
+    os.close(os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+    try:
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, dest)
+    except BaseException:
+        _unlink_quietly(dest)  # don't leave the empty placeholder behind
+        raise
+
+
+async def publish_upload(tmp: str, name: str) -> Path:
+    """Move a finished temp file to a collision-free name based on `name`."""
+    while True:
+        candidate = upload_names.reserve(name)
+        dest = upload_names.directory / candidate
+        try:
+            await asyncio.to_thread(_publish_exclusive, tmp, dest)
+            return dest
+        except FileExistsError:
+            continue  # created outside the wrapper; now indexed, try the next
+        except BaseException:
+            upload_names.discard(candidate)
+            raise
+
+
+def sanitize_upload_name(raw_name: Optional[str]) -> str:
+    """Strip path components and special characters from a client filename."""
+    name = Path(raw_name or "photo.jpg").name
+    name = re.sub(r'[^\w.\-]', '_', name)
+    if not name or name.startswith('.'):
+        name = "photo.jpg"
+    return name
+
+
+async def save_upload(file: UploadFile) -> dict:
+    """Stream an upload to a temp file in UPLOAD_DIR, then rename it into place.
+
+    Chunks are written off the event loop as they are read, so memory use
+    stays around one chunk per upload regardless of file size.
+    """
+    await asyncio.to_thread(UPLOAD_DIR.mkdir, parents=True, exist_ok=True)
+    name = sanitize_upload_name(file.filename)
+    fd, tmp = await asyncio.to_thread(
+        tempfile.mkstemp, dir=UPLOAD_DIR, prefix=".upload-", suffix=".part")
+    start = time.perf_counter()
+    try:
+        total = 0
+        digest = hashlib.sha256()
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                upload_bytes.inc(len(chunk))
+                if total > MAX_UPLOAD_SIZE:
+                    uploads.inc(result="too_large")
+                    return {"error": "File too large (max 20MB)"}
+                await asyncio.to_thread(_write_hashed, out, digest, chunk)
+        result = await finish_upload(tmp, name, digest.hexdigest())
+        tmp = None
+    finally:
+        if tmp is not None:
+            await asyncio.to_thread(_unlink_quietly, tmp)
+    elapsed = time.perf_counter() - start
+    uploads.inc(result="duplicate" if result.get("duplicate") else "stored")
+    upload_duration.observe(elapsed)
+    if elapsed > 0:
+        upload_rate.observe(total / elapsed)
+    return result
+
+
+def _write_hashed(out, digest, chunk: bytes):
+    out.write(chunk)
+    digest.update(chunk)
+
+
+async def finish_upload(tmp: str, name: str, digest: str) -> dict:
+    """Normalize, deduplicate and publish a fully received temp file.
+
+    Takes ownership of `tmp`: it is either renamed into place or removed.
+    """
+    try:
+        normalized = await normalize_upload(tmp)
+    except Exception as e:
+        print(f"image normalization failed for {name}, keeping the original: {e!r}")
+        normalized = None
+    if normalized is not None:
+        await asyncio.to_thread(_unlink_quietly, tmp)
+        tmp, ext, digest = normalized
+        name = Path(name).stem + ext
+    existing = upload_names.find(digest)
+    if existing is not None:
+        dest = upload_names.directory / existing
+        try:
+            # A re-upload counts as a use, so retention keeps the file
+            await asyncio.to_thread(os.utime, dest)
+        except FileNotFoundError:
+            pass  # evicted meanwhile: publish this copy instead
+        else:
+            await asyncio.to_thread(_unlink_quietly, tmp)
+            return {"name": dest.name, "path": str(dest), "duplicate": True}
+    try:
+        dest = await publish_upload(tmp, name)
+    except BaseException:
+        await asyncio.to_thread(_unlink_quietly, tmp)
+        raise
+    upload_names.remember(dest.name, digest)
+    return {"name": dest.name, "path": str(dest)}
+
+
+def _unlink_quietly(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# ── upload retention ────────────────────────────────────────────────────
+# /tmp is often tmpfs (RAM), so uploads are evicted by age, then least
+# recently used first until both the byte and file-count quotas hold.
+# A limit of 0 disables it.
+
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_MAX_FILES = int(os.environ.get("UPLOAD_MAX_FILES", "1000"))
+UPLOAD_MAX_AGE = float(os.environ.get("UPLOAD_MAX_AGE", str(7 * 24 * 3600)))
+UPLOAD_CLEANUP_INTERVAL = float(os.environ.get("UPLOAD_CLEANUP_INTERVAL", "300"))
+STALE_PART_AGE = 3600  # temp files left behind by a crash mid-upload or a restart
+
+
+class UploadEntry(NamedTuple):
+    name: str
+    size: int
+    last_used: float  # newer of atime and mtime
+
+
+class UploadRetention:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.files = 0
+        self.bytes = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.last_run = 0.0
+
+    def scan(self) -> list[UploadEntry]:
+        """List uploads, deleting stale temp files along the way."""
+        entries = []
+        now = time.time()
+        try:
+            it = os.scandir(self.directory)
+        except FileNotFoundError:
+            return entries
+        with it:
+            for e in it:
+                try:
+                    st = e.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if e.name.startswith("."):
+                    if (e.name.endswith((".part", ".partial"))
+                            and now - st.st_mtime > max(STALE_PART_AGE, UPLOAD_SESSION_TTL)):
+                        _unlink_quietly(e.path)
+                    continue
+                if e.is_file(follow_symlinks=False):
+                    entries.append(UploadEntry(e.name, st.st_size, max(st.st_atime, st.st_mtime)))
+        return entries
+
+    def select_evictions(self, entries: list[UploadEntry], now: float) -> list[UploadEntry]:
+        entries = sorted(entries, key=lambda e: e.last_used)
+        total = sum(e.size for e in entries)
+        evict = []
+        for i, entry in enumerate(entries):
+            remaining = len(entries) - i
+            expired = UPLOAD_MAX_AGE and now - entry.last_used > UPLOAD_MAX_AGE
+            over_bytes = UPLOAD_MAX_BYTES and total > UPLOAD_MAX_BYTES
+            over_files = UPLOAD_MAX_FILES and remaining > UPLOAD_MAX_FILES
+            if not (expired or over_bytes or over_files):
+                break
+            evict.append(entry)
+            total -= entry.size
+        return evict
+
+    def enforce(self) -> list[str]:
+        """Scan and evict in one pass (runs in a worker thread)."""
+        entries = self.scan()
+        evicted = []
+        for entry in self.select_evictions(entries, time.time()):
+            try:
+                os.unlink(self.directory / entry.name)
+            except FileNotFoundError:
+                pass
+            evicted.append(entry)
+        gone = {e.name for e in evicted}
+        kept = [e for e in entries if e.name not in gone]
+        self.files = len(kept)
+        self.bytes = sum(e.size for e in kept)
+        self.evicted_files += len(evicted)
+        self.evicted_bytes += sum(e.size for e in evicted)
+        self.last_run = time.time()
+        return sorted(gone)
+
+
+upload_retention = UploadRetention(UPLOAD_DIR)
+
+
+async def enforce_upload_retention() -> list[str]:
+    evicted = await asyncio.to_thread(upload_retention.enforce)
+    for name in evicted:
+        upload_names.discard(name)
+    return evicted
+
+
+@background_task
+async def upload_cleanup_loop():
+    while True:
+        try:
+            await expire_upload_sessions()
+            await enforce_upload_retention()
+        except OSError as e:
+            print(f"upload cleanup failed: {e}")
+        await asyncio.sleep(UPLOAD_CLEANUP_INTERVAL)
+
+
+@app.get("/upload/usage")
+async def upload_usage():
+    """Current size of UPLOAD_DIR, the configured quotas and eviction totals."""
+    entries = await asyncio.to_thread(upload_retention.scan)
+    return {
+        "files": len(entries),
+        "bytes": sum(e.size for e in entries),
+        "limits": {
+            "max_bytes": UPLOAD_MAX_BYTES,
+            "max_files": UPLOAD_MAX_FILES,
+            "max_age": UPLOAD_MAX_AGE,
+        },
+        "evicted_files": upload_retention.evicted_files,
+        "evicted_bytes": upload_retention.evicted_bytes,
+        "last_cleanup": upload_retention.last_run or None,
+    }
+
+
+# ── image normalization ─────────────────────────────────────────────────
+# With IMAGE_NORMALIZE=1, uploaded images larger than IMAGE_MAX_DIM or in
+# a format outside IMAGE_KEEP_FORMATS are resized and re-encoded without
+# metadata in a process pool, whichever client sent them. Anything already
+# fine, and animations, are kept byte for byte. Identical results are
+# deduplicated by SHA-256.
+
+IMAGE_NORMALIZE = os.environ.get("IMAGE_NORMALIZE", "0") == "1" and Image is not None
+IMAGE_MAX_DIM = int(os.environ.get("IMAGE_MAX_DIM", "1568"))
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "85"))
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+IMAGE_KEEP_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}  # left alone when small enough
+
+_image_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+
+def normalize_image_file(path: str, max_dim: int, quality: int):
+    """Re-encode an image file; returns (new path, extension, sha256) or None.
+
+    Runs in a worker process. PNGs and images with transparency stay PNG,
+    everything else becomes JPEG. Returns None, keeping the upload as is,
+    for non-images, animations and images that need no change.
+    """
+    try:
+        img = Image.open(path)
+        if getattr(img, "is_animated", False):
+            return None
+        if img.format in IMAGE_KEEP_FORMATS and max(img.size) <= max_dim:
+            return None
+        img.load()
+    except Exception:
+        return None
+    source_format = img.format
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_dim, max_dim))
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    fd, out_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-", suffix=".part")
+    with os.fdopen(fd, "wb") as out:
+        if has_alpha or source_format == "PNG":
+            img.save(out, "PNG", optimize=True)
+            ext = ".png"
+        else:
+            img.convert("RGB").save(out, "JPEG", quality=quality, optimize=True)
+            ext = ".jpg"
+    with open(out_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return out_path, ext, digest
+
+
+async def normalize_upload(path: str):
+    global _image_pool
+    if not IMAGE_NORMALIZE:
+        return None
+    if _image_pool is None:
+        _image_pool = concurrent.futures.ProcessPoolExecutor(
+            IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"), **spawned_workers())
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            _image_pool, normalize_image_file, path, IMAGE_MAX_DIM, IMAGE_QUALITY)
+    except concurrent.futures.process.BrokenProcessPool:
+        _image_pool = None  # start a fresh pool next time
+        raise
+
+
+@on_shutdown
+async def stop_image_pool():
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ── upload endpoints ────────────────────────────────────────────────────
+
+@app.post("/upload")
+async def upload_file(file: UploadFile = File(...)):
+    """Save an uploaded file using its original name and return the path."""
+    return await save_upload(file)
+
+
+@app.post("/upload/batch")
+async def upload_files(files: list[UploadFile] = File(...)):
+    """Save several files from one multipart request, written in parallel."""
+    results = await asyncio.gather(*(save_upload(f) for f in files))
+    return {"files": results}
+
+
+# ── resumable uploads ───────────────────────────────────────────────────
+# For flaky mobile links: the client opens an upload session, PUTs chunks
+# at byte offsets (in parallel, in any order, retrying as needed), asks
+# which ranges arrived after a network switch, then finishes. Chunks are
+# written in place into a sparse .partial file, so nothing is reassembled;
+# finishing hashes it and publishes it like any other upload.
+
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL", "3600"))
+UPLOAD_SESSION_MAX_CHUNK = 8 * 1024 * 1024
+
+
+class UploadSession:
+    def __init__(self, name: str, size: int):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.size = size
+        self.path = UPLOAD_DIR / f".upload-{self.id}.partial"
+        self.ranges: list[list[int]] = []  # merged [start, end) byte ranges received
+        self.created = time.perf_counter()
+        self.touched = time.monotonic()
+        self.writers = 0
+        self.finishing = False
+
+    def add_range(self, start: int, end: int):
+        """Record [start, end) as received, merging with neighbours."""
+        merged = []
+        for r in self.ranges:
+            if r[1] < start or r[0] > end:
+                merged.append(r)
+            else:
+                start, end = min(start, r[0]), max(end, r[1])
+        merged.append([start, end])
+        self.ranges = sorted(merged)
+
+    @property
+    def received(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    @property
+    def complete(self) -> bool:
+        return self.ranges == [[0, self.size]] or self.size == 0
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id, "name": self.name, "size": self.size,
+            "chunk_size": UPLOAD_CHUNK_SIZE, "received": self.ranges,
+            "received_bytes": self.received, "complete": self.complete,
+        }
+
+
+upload_sessions: dict[str, UploadSession] = {}
+
+
+def _create_partial(path: Path, size: int):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "xb") as f:
+        f.truncate(size)
+
+
+def _pwrite_hashed(path: Path, offset: int, data: bytes, digest):
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view, offset = view[written:], offset + written
+    finally:
+        os.close(fd)
+    digest.update(data)
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_upload_session(upload_id: str) -> UploadSession:
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="unknown or expired upload")
+    session.touched = time.monotonic()
+    return session
+
+
+class UploadSessionInput(BaseModel):
+    name: Optional[str] = None
+    size: int
+
+
+@app.post("/upload/session")
+async def create_upload_session(payload: UploadSessionInput):
+    """Start a resumable upload of `size` bytes; returns its id and chunk size."""
+    if payload.size < 0 or payload.size > MAX_UPLOAD_SIZE:
+        uploads.inc(result="too_large")
+        raise HTTPException(status_code=413, detail="File too large (max 20MB)")
+    session = UploadSession(sanitize_upload_name(payload.name), payload.size)
+    await asyncio.to_thread(_create_partial, session.path, session.size)
+    upload_sessions[session.id] = session
+    return session.as_dict()
+
+
+@app.get("/upload/session/{upload_id}")
+async def upload_session_status(upload_id: str):
+    """Byte ranges received so far, so a client can resend only what's missing."""
+    return get_upload_session(upload_id).as_dict()
+
+
+@app.put("/upload/session/{upload_id}")
+async def put_upload_chunk(upload_id: str, request: Request, offset: str = "0",
+                           sha256: Optional[str] = None):
+    """Write the request body at `offset`.
+
+    With `sha256`, the range is only marked received if the body matches
+    it; a mismatch answers 400 and the chunk should be sent again.
+    """
+    session = get_upload_session(upload_id)
+    try:
+        offset = int(offset)
+        length = request.headers.get("content-length")
+        length = int(length) if length is not None else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bad offset or content-length")
+    if session.finishing:
+        raise HTTPException(status_code=409, detail="upload is being finished")
+    if offset < 0 or (length is not None and (
+            length > UPLOAD_SESSION_MAX_CHUNK or offset + length > session.size)):
+        raise HTTPException(status_code=400, detail="chunk outside the upload")
+    digest = hashlib.sha256()
+    position = offset
+    session.writers += 1
+    try:
+        buffer = bytearray()
+        async for piece in request.stream():
+            buffer += piece
+            end = position + len(buffer)
+            if end > session.size or end - offset > UPLOAD_SESSION_MAX_CHUNK:
+                raise HTTPException(status_code=400, detail="chunk outside the upload")
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(_pwrite_hashed, session.path, position, bytes(buffer), digest)
+                position += len(buffer)
+                buffer.clear()
+        if buffer:
+            await asyncio.to_thread(_pwrite_hashed, session.path, position, bytes(buffer), digest)
+            position += len(buffer)
+    except FileNotFoundError:
+        upload_sessions.pop(upload_id, None)
+        raise HTTPException(status_code=410, detail="upload expired")
+    finally:
+        session.writers -= 1
+    upload_bytes.inc(position - offset)
+    if sha256 is not None and digest.hexdigest() != sha256.lower():
+        raise HTTPException(status_code=400, detail="chunk checksum mismatch")
+    if position > offset:
+        session.add_range(offset, position)
+    return session.as_dict()
+
+
+@app.post("/upload/session/{upload_id}/finish")
+async def finish_upload_session(upload_id: str, sha256: Optional[str] = None):
+    """Publish a fully received upload under a collision-free name.
+
+    Answers 409 with the received ranges if bytes are still missing.
+    """
+    session = get_upload_session(upload_id)
+    if not session.complete or session.writers or session.finishing:
+        raise HTTPException(status_code=409, detail={"error": "upload incomplete", **session.as_dict()})
+    session.finishing = True
+    try:
+        digest = await asyncio.to_thread(_hash_file, session.path)
+    except FileNotFoundError:
+        upload_sessions.pop(upload_id, None)
+        raise HTTPException(status_code=410, detail="upload expired")
+    if sha256 is not None and digest != sha256.lower():
+        session.finishing = False
+        session.ranges = []
+        uploads.inc(result="checksum_mismatch")
+        raise HTTPException(status_code=400, detail="file checksum mismatch; upload again")
+    del upload_sessions[upload_id]
+    result = await finish_upload(str(session.path), session.name, digest)
+    elapsed = time.perf_counter() - session.created
+    uploads.inc(result="duplicate" if result.get("duplicate") else "stored")
+    upload_duration.observe(elapsed)
+    if elapsed > 0:
+        upload_rate.observe(session.size / elapsed)
+    return result
+
+
+@app.delete("/upload/session/{upload_id}")
+async def abort_upload_session(upload_id: str):
+    session = upload_sessions.pop(upload_id, None)
+    if session is not None:
+        await asyncio.to_thread(_unlink_quietly, session.path)
+    return {"status": "aborted"}
+
+
+async def expire_upload_sessions() -> list[str]:
+    """Drop sessions idle for UPLOAD_SESSION_TTL, with their partial files."""
+    now = time.monotonic()
+    expired = [s for s in upload_sessions.values()
+               if now - s.touched > UPLOAD_SESSION_TTL and not s.writers and not s.finishing]
+    for session in expired:
+        del upload_sessions[session.id]
+        await asyncio.to_thread(_unlink_quietly, session.path)
+        uploads.inc(result="expired")
+    return [s.id for s in expired]
+
+
+# ── process supervisor ──────────────────────────────────────────────────
+# With SUPERVISE=1 (as start-remote-cli.sh runs it) the wrapper owns ttyd
+# and the sleep inhibitor: a crashed child is restarted within a second,
+# backing off exponentially if it keeps failing, and ttyd's port is probed
+# so a hung ttyd is replaced too. /health reports the state of each.
+
+SUPERVISE = os.environ.get("SUPERVISE", "0") != "0"
+SUPERVISOR_LOG_DIR = os.environ.get("SUPERVISOR_LOG_DIR", "")
+SUPERVISOR_BACKOFF_MIN = 0.5
+SUPERVISOR_BACKOFF_MAX = 30.0
+SUPERVISOR_STABLE_AFTER = 30.0  # a run this long resets the backoff
+HEALTH_INTERVAL = 2.0
+HEALTH_FAILURES = 3  # consecutive failed probes before a restart
+STARTUP_GRACE = 10.0  # seconds a new process gets to open its port
+CONDITION_INTERVAL = 30.0
+STARTED_AT = time.time()
+
+
+async def probe_tcp(host: str, port: int, timeout: float = 1.0) -> bool:
+    """True if something accepts connections on host:port."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+class ManagedProcess:
+    """One child process kept running, restarted with exponential backoff.
+
+    `probe` is a (host, port) that must accept connections for the process
+    to count as ready. `condition` is an async predicate; while it is false
+    the process is stopped without counting as a failure. Only `required`
+    processes hold back readiness in /health.
+    """
+
+    def __init__(self, name: str, argv: list[str], probe: Optional[tuple[str, int]] = None,
+                 condition: Optional[Callable] = None, required: bool = True):
+        self.name = name
+        self.argv = argv
+        self.probe = probe
+        self.condition = condition
+        self.required = required
+        self.state = "stopped"
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.ready_at: Optional[float] = None
+        self.last_exit: Optional[dict] = None
+        self.delay = SUPERVISOR_BACKOFF_MIN
+        self.retry_at: Optional[float] = None
+
+    def _path(self, suffix: str) -> Optional[Path]:
+        return Path(SUPERVISOR_LOG_DIR) / f"{self.name}{suffix}" if SUPERVISOR_LOG_DIR else None
+
+    async def _spawn(self):
+        log_path = self._path(".log")
+        log = open(log_path, "ab") if log_path else None
+        try:
+            self.proc = await asyncio.create_subprocess_exec(
+                *self.argv, stdin=asyncio.subprocess.DEVNULL,
+                stdout=log, stderr=asyncio.subprocess.STDOUT if log else None,
+            )
+        finally:
+            if log:
+                log.close()
+        self.started_at = time.monotonic()
+        self.ready_at = None
+        self.state = "starting" if self.probe else "running"
+        pid_path = self._path(".pid")
+        if pid_path:
+            pid_path.write_text(f"{self.proc.pid}\n")
+        print(f"[supervisor] {self.name} started (PID {self.proc.pid})")
+
+    async def _watch(self) -> str:
+        """Wait until the process exits, fails its probes or is paused."""
+        waiter = asyncio.ensure_future(self.proc.wait())
+        failures = 0
+        checked = time.monotonic()
+        try:
+            while True:
+                interval = 0.2 if self.state == "starting" else HEALTH_INTERVAL
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter), interval)
+                    return f"exited with status {self.proc.returncode}"
+                except asyncio.TimeoutError:
+                    pass
+                if self.condition and time.monotonic() - checked >= CONDITION_INTERVAL:
+                    checked = time.monotonic()
+                    if not await self.condition():
+                        await self.stop()
+                        return "paused"
+                if not self.probe:
+                    continue
+                if await probe_tcp(*self.probe):
+                    failures = 0
+                    if self.state != "ready":
+                        self.state, self.ready_at = "ready", time.time()
+                    continue
+                if self.state == "starting" and time.monotonic() - self.started_at < STARTUP_GRACE:
+                    continue
+                failures += 1
+                self.state = "unhealthy"
+                if failures >= HEALTH_FAILURES:
+                    await self.stop()
+                    return f"failed {failures} health probes"
+        finally:
+            waiter.cancel()
+
+    async def run(self):
+        """Keep the process running until cancelled, then stop it."""
+        try:
+            while True:
+                if self.condition and not await self.condition():
+                    self.state = "paused"
+                    await asyncio.sleep(CONDITION_INTERVAL)
+                    continue
+                try:
+                    await self._spawn()
+                except OSError as e:
+                    reason, runtime = f"failed to start: {e}", 0.0
+                else:
+                    reason = await self._watch()
+                    runtime = time.monotonic() - self.started_at
+                    if reason == "paused":
+                        print(f"[supervisor] {self.name} paused")
+                        continue
+                self.last_exit = {"reason": reason, "at": time.time(), "runtime": round(runtime, 1)}
+                if runtime >= SUPERVISOR_STABLE_AFTER:
+                    self.delay = SUPERVISOR_BACKOFF_MIN
+                self.restarts += 1
+                process_restarts.inc(process=self.name)
+                self.state = "backoff"
+                self.retry_at = time.time() + self.delay
+                print(f"[supervisor] {self.name} {reason} after {runtime:.1f}s; "
+                      f"restarting in {self.delay:.1f}s")
+                await asyncio.sleep(self.delay)
+                self.retry_at = None
+                self.delay = min(self.delay * 2, SUPERVISOR_BACKOFF_MAX)
+        finally:
+            await self.stop()
+            self.state = "stopped"
+
+    async def stop(self):
+        proc = self.proc
+        if proc is not None and proc.returncode is None:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), 3)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        pid_path = self._path(".pid")
+        if pid_path and proc is not None:
+            try:
+                if pid_path.read_text().strip() == str(proc.pid):
+                    pid_path.unlink()
+            except OSError:
+                pass
+
+    def as_dict(self) -> dict:
+        running = self.proc is not None and self.proc.returncode is None
+        return {
+            "state": self.state,
+            "required": self.required,
+            "pid": self.proc.pid if running else None,
+            "uptime": round(time.monotonic() - self.started_at, 1) if running else None,
+            "ready_at": self.ready_at,
+            "restarts": self.restarts,
+            "backoff": self.delay,
+            "retry_at": self.retry_at,
+            "last_exit": self.last_exit,
+        }
+
+
+def ttyd_process(host: str) -> ManagedProcess:
+    argv = [
+        TTYD, "--port", str(TTYD_PORT), "--interface", host, "--writable", "--url-arg",
+        "-t", "fontSize=14",
+        "-t", "lineHeight=1.2",
+        "-t", "cursorBlink=true",
+        "-t", "cursorStyle=block",
+        "-t", "scrollback=10000",
+        "-t", "scrollSensitivity=3",
+        "-t", "fastScrollSensitivity=10",
+        "-t", "smoothScrollDuration=100",
+        "-t", 'fontFamily="Menlo, Monaco, Consolas, monospace, Apple Color Emoji, Segoe UI Emoji"',
+        str(Path(__file__).resolve().parent / "tmux-attach.sh"),
+    ]
+    return ManagedProcess("ttyd", argv, probe=(host, TTYD_PORT))
+
+
+async def on_ac_power() -> bool:
+    result = await run_command(["pmset", "-g", "ps"], timeout=5)
+    return "AC Power" in result.stdout.split("\n", 1)[0]
+
+
+def sleep_inhibitor() -> Optional[ManagedProcess]:
+    """caffeinate on macOS (only while on AC power), systemd-inhibit on Linux."""
+    if platform.system() == "Darwin":
+        return ManagedProcess("inhibit", ["caffeinate", "-i", "-s"],
+                              condition=on_ac_power, required=False)
+    inhibit = shutil.which("systemd-inhibit")
+    if inhibit:
+        return ManagedProcess("inhibit", [
+            inhibit, "--what=idle", "--who=remote-cli",
+            "--why=Keeping machine awake for remote CLI", "sleep", "infinity",
+        ], required=False)
+    print("[supervisor] WARNING: no sleep inhibitor available (caffeinate/systemd-inhibit not found)")
+    return None
+
+
+supervised: list[ManagedProcess] = []
+
+
+@background_task
+async def supervise():
+    if not SUPERVISE:
+        return
+    host = await fetch_tailscale_ip() or "127.0.0.1"
+    supervised.append(ttyd_process(host))
+    inhibitor = sleep_inhibitor()
+    if inhibitor is not None:
+        supervised.append(inhibitor)
+    await asyncio.gather(*(p.run() for p in supervised))
+
+
+@app.get("/health")
+async def health():
+    """Readiness of the wrapper and every supervised process (503 if any isn't up)."""
+    ready = all(p.state in ("ready", "running", "paused") for p in supervised if p.required)
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "ready": ready,
+        "uptime": round(time.time() - STARTED_AT, 1),
+        "supervising": SUPERVISE,
+        "processes": {p.name: p.as_dict() for p in supervised},
+        "tmux_control": control_client().connected,
+    })
 
 
 if __name__ == "__main__":
-    ip = get_tailscale_ip()
+    ip = WRAPPER_HOST or get_tailscale_ip()
     print(f"Voice wrapper: http://{ip}:{WRAPPER_PORT}")
     print(f"Terminal (ttyd): http://{ip}:{TTYD_PORT}")
     uvicorn.run(app, host=ip, port=WRAPPER_PORT)